@@ -1,44 +1,143 @@
 import streamlit as st
-from openai import OpenAI
 import datetime
+import time
 import json
 import re
 from typing import List
 from pdf_builder import build_pdf
-from tts import text_to_speech
+from tts import text_to_speech, stop_speech, prefetch, get_speech_cache, FIXED_PROMPTS, DESCRIBE_SYMPTOMS_PROMPT
 from stt import speech_to_text
 from json_builder import extract_prescription_data
-from ocr import perform_ocr
-from mtest_data_parser import extract_text_from_json
-from detect_fracture import predict_fracture
-import whisper
+from ocr import ocr_report_text
+from mtest_data_parser import extract_text_from_ocr
+from detect_fracture import predict_fracture_bytes
 from multiprocessing import Process
+import config
+from model_registry import registry
+import transcribers  # registers the "transcriber" model
+from llm_streaming import QuestionSplitter, SectionSplitter
+from llm_client import LLMPool
+from context_builder import build_context, report_message
+from llm_cache import new_response_cache
+from artifacts import ArtifactStore
+from disk_cache import DiskCache
+from concurrent.futures import ThreadPoolExecutor
 
 API_KEY = "Upload your key here"
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=API_KEY,
-)
+@st.cache_resource
+def get_llm_pool():
+    # one pool per process, so sessions share connections and the concurrency limit
+    return LLMPool(config.LLM_BASE_URL, config.LLM_API_KEY or API_KEY)
+
+@st.cache_resource
+def start_model_registry():
+    # once per process: warm the configured models off the script thread
+    registry.warmup(config.WARMUP_MODELS, background=True)
+    registry.start_idle_reaper(config.MODEL_IDLE_UNLOAD_SECONDS)
+    prefetch(FIXED_PROMPTS)
+    return registry
+
+def load_speech_model():
+    return registry.get("transcriber")
+
+LLM_MODEL = "deepseek/deepseek-r1:free"
+PRESCRIBER_FOOTER = "\n\n**Prescriber**: Dr. AI Medic. MD\n---"
 
 @st.cache_resource
-def load_whisper_model():
-    return whisper.load_model("medium")
+def get_background():
+    # module-level code reruns on every interaction; keep a single executor
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="pipeline")
+
+LLM_PARAMS = {"max_tokens": 10000}
 
-def ask_ai(messages):
-    response = client.chat.completions.create(
-        model="deepseek/deepseek-r1:free",
-        messages=messages,
-        max_tokens=10000,
-    )
-    return response.choices[0].message.content
+@st.cache_resource
+def get_llm_cache():
+    return new_response_cache() if config.LLM_CACHE_ENABLED else None
+
+def ask_ai_stream(messages):
+    messages = build_context(messages)
+    call = lambda: get_llm_pool().stream(messages, LLM_MODEL, **LLM_PARAMS)
+    cache = get_llm_cache()
+    return cache.stream(LLM_MODEL, messages, LLM_PARAMS, call) if cache else call()
+
+def speakable(text):
+    return text.replace('e.g.', 'for example').replace('i.e.', 'that is')
+
+def get_artifacts():
+    # per session, so concurrent users never share files
+    if "artifacts" not in st.session_state:
+        st.session_state.artifacts = ArtifactStore()
+    return st.session_state.artifacts
+
+def read_test_reports(files):
+    # files: (name, bytes) pairs; PaddleOCR JSON is laid out directly, images and PDFs are OCR'd
+    json_pages = [json.loads(data) for name, data in files if name.endswith(".json")]
+    scanned = [data for name, data in files if not name.endswith(".json")]
+    test_ocr = extract_text_from_ocr(json_pages)
+    if scanned:
+        test_ocr = "\n".join(t for t in [test_ocr, ocr_report_text(scanned)] if t)
+    return test_ocr
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    return fn(*args), time.perf_counter() - start
+
+def start_job(name, key, fn, *args):
+    # Runs fn(*args) on the pipeline executor as soon as its input is known.
+    # Reruns with the same key reuse the job; a new key (another upload) replaces it.
+    jobs = st.session_state.setdefault("jobs", {})
+    if name not in jobs or jobs[name]["key"] != key:
+        jobs[name] = {"key": key, "future": get_background().submit(timed, fn, *args), "collected": False}
+
+def drop_job(name):
+    job = st.session_state.get("jobs", {}).pop(name, None)
+    if job is not None:
+        job["future"].cancel()
+
+def job_result(name):
+    # Waits for the job if it is still running. The part of its run time
+    # that the user did not have to wait for is counted as saved.
+    job = st.session_state.jobs[name]
+    start = time.perf_counter()
+    result, seconds = job["future"].result()
+    waited = time.perf_counter() - start
+    if not job["collected"]:
+        job["collected"] = True
+        saved = max(0.0, seconds - waited)
+        st.session_state.time_saved = st.session_state.get("time_saved", 0.0) + saved
+        print(f"Background job {name}: ran {seconds:.1f}s, waited {waited:.1f}s, saved {saved:.1f}s")
+    return result
+
+def build_prescription(prescription_text):
+    # prescription_text: the response up to (not including) **Reasoning**.
+    # Runs on a worker thread, so it returns the results instead of storing them.
+    final_response = prescription_text.rstrip() + PRESCRIBER_FOOTER
+    data = extract_prescription_data(final_response)
+    return data, build_pdf(data)
 
 def app():
-    with st.spinner('Loading voice model...'):
-        model = load_whisper_model()
+    start_model_registry()
 
     st.title("🩺 AI Doctor - Virtual Medical Assistant")
 
+    with st.sidebar.expander("Model status"):
+        st.text(registry.report())
+        speech = get_speech_cache().stats()
+        st.text(f"Speech cache: {speech['hits']} hits, {speech['misses']} misses "
+                f"({speech['hit_rate']:.0%} hit rate)")
+        llm = get_llm_pool().summary()
+        if llm["requests"]:
+            st.text(f"LLM: {llm['requests']} requests, {llm['failed']} failed, {llm['cancelled']} cancelled, "
+                    f"{llm['retried']} retried, p95 queue {llm['queue_wait_p95']:.2f}s, "
+                    f"p95 latency {llm['latency_p95'] or 0:.1f}s")
+        if get_llm_cache():
+            cached = get_llm_cache().stats()
+            st.text(f"LLM cache: {cached['hits']} hits, {cached['joined']} joined in flight, "
+                    f"{cached['seconds_saved']:.0f}s saved")
+        if st.session_state.get("time_saved"):
+            st.text(f"Background uploads processing: {st.session_state.time_saved:.1f}s saved this session")
+
     name = st.text_input("Enter your name:")
     age = st.text_input("Enter your age:")
     gender = st.radio("What's your gender?", ["Male", "Female"])
@@ -46,7 +145,19 @@ def app():
     if name and age:
         st.markdown("### Upload Medical Files (optional)")
         xray_image = st.file_uploader("Upload X-ray Image (JPEG/PNG)", type=["jpg", "jpeg", "png"])
-        test_report = st.file_uploader("Upload Test Report (Image or JSON)", type=["jpg", "jpeg", "png", "json"])
+        test_reports = st.file_uploader("Upload Test Report (Images, PDF or JSON)", type=["jpg", "jpeg", "png", "pdf", "json"], accept_multiple_files=True)
+
+        # start on the uploads now; the results are only needed later
+        if xray_image:
+            xray_bytes = xray_image.getvalue()
+            start_job("xray", DiskCache.key(xray_bytes), predict_fracture_bytes, xray_bytes)
+        else:
+            drop_job("xray")
+        if test_reports:
+            files = [(r.name, r.getvalue()) for r in test_reports]
+            start_job("reports", DiskCache.key(*[part for f in files for part in f]), read_test_reports, files)
+        else:
+            drop_job("reports")
 
         use_voice = st.radio("Do you want to use voice for communication?", ["Yes", "No"])
 
@@ -54,7 +165,9 @@ def app():
         if use_voice == "Yes":
             st.write("Please speak your symptoms when ready...")
             if st.button("Start Recording"):
-                text_to_speech("Please describe your symptoms. Please speak when told to do so.")
+                with st.spinner('Loading voice model...'):
+                    model = load_speech_model()
+                text_to_speech(DESCRIBE_SYMPTOMS_PROMPT)
                 symptom = speech_to_text(model)
                 st.session_state.symptom = symptom
                 st.success(f"You said: {symptom}")
@@ -68,9 +181,8 @@ def app():
         if st.button("Generate Prescription") and st.session_state.symptom.strip():
             fracture_status = ""
             if xray_image:
-                with open("xray_image.jpeg", "wb") as f:
-                    f.write(xray_image.read())
-                fracture_status = predict_fracture("xray_image.jpeg")
+                with st.spinner("Analysing X-ray..."):
+                    fracture_status = job_result("xray")
             else:
                 fracture_status = "No X-ray image provided."
 
@@ -83,8 +195,26 @@ def app():
                 {"role": "user", "content": f"My name is {name}, I am {age} years old and {gender}. I am experiencing: {st.session_state.symptom}"}
             ]
 
-            ai_response = ask_ai(messages)
-            ai_questions = [q.strip() + "?" for q in ai_response.split("?") if q.strip()]
+            # show and speak the first question while the rest are still streaming
+            st.subheader("🤖 Follow-Up Question")
+            first_question = st.empty()
+            progress = st.empty()
+            splitter = QuestionSplitter()
+            ai_questions = []
+            st.session_state.spoken_index = None
+            for delta in ask_ai_stream(messages):
+                for question in splitter.feed(delta):
+                    if not ai_questions:
+                        first_question.write(question)
+                        if use_voice == "Yes":
+                            stop_speech()
+                            text_to_speech(question, wait=False)
+                            st.session_state.spoken_index = 0
+                    elif use_voice == "Yes":
+                        prefetch([question])
+                    ai_questions.append(question)
+                    progress.caption(f"Preparing follow-up questions... ({len(ai_questions)} so far)")
+            ai_questions += splitter.close()
 
             st.session_state.messages = messages
             st.session_state.questions = ai_questions
@@ -102,8 +232,15 @@ def app():
                 st.write(current_question)
 
                 if use_voice == "Yes":
-                    text_to_speech(current_question)
+                    # speak each question once, without blocking the page
+                    if st.session_state.get("spoken_index") != current_index:
+                        stop_speech()
+                        text_to_speech(current_question, wait=False)
+                        st.session_state.spoken_index = current_index
+                    prefetch(questions[current_index + 1:])
                     if st.button("🎤 Record Voice Answer"):
+                        with st.spinner('Loading voice model...'):
+                            model = load_speech_model()
                         answer = speech_to_text(model)
                         st.session_state.voice_answer = answer
                         st.success(f"You said: {answer}")
@@ -137,21 +274,10 @@ def app():
                 ])
                 st.session_state.messages.append({"role": "user", "content": qna})
 
-                if test_report:
-                    test_path = "uploaded_test"
-                    if test_report.name.endswith(".json"):
-                        with open(f"{test_path}.json", "wb") as f:
-                            f.write(test_report.read())
-                        test_ocr = extract_text_from_json(f"{test_path}.json")
-                    else:
-                        with open(f"{test_path}.png", "wb") as f:
-                            f.write(test_report.read())
-                        perform_ocr(f"{test_path}.png")
-                        test_ocr = extract_text_from_json("output/large_res.json")
-                    st.session_state.messages.append({
-                        "role": "user",
-                        "content": f"This is the OCR output of the uploaded medical test report. Please consider this information while generating the prescription. The OCR output is as follows:\n\n{test_ocr}"
-                    })
+                if test_reports:
+                    with st.spinner("Reading test reports..."):
+                        test_ocr = job_result("reports")
+                    st.session_state.messages.append(report_message(test_ocr))
 
                 today = datetime.date.today().strftime("%B %d, %Y")
                 prescription_prompt = f"""
@@ -182,36 +308,50 @@ def app():
                 ---
                 """
                 st.session_state.messages.append({"role": "user", "content": prescription_prompt})
-                original_response = ask_ai(st.session_state.messages)
 
                 st.subheader("📄 Final Prescription")
-                st.markdown(original_response)
+                live = st.empty()
+                sections = SectionSplitter()
+                early_build = None
+                for delta in ask_ai_stream(st.session_state.messages):
+                    completed = sections.feed(delta)
+                    live.markdown(sections.text)
+                    # everything before **Reasoning** is final once it starts: build the PDF meanwhile
+                    if early_build is None and "Reasoning" in sections.starts:
+                        early_prefix = sections.text[:sections.starts["Reasoning"]]
+                        early_build = get_background().submit(build_prescription, early_prefix)
+                    for title, body in completed:
+                        if title == "Reasoning":
+                            prefetch([speakable(body)])
+                sections.close()
+                original_response = sections.text
+                live.markdown(original_response)
 
                 reasoning_start = original_response.find("**Reasoning**:")
                 reasoning_end = original_response.find("**Prescriber**")
 
                 reasoning = original_response[reasoning_start + len("**Reasoning**:"):reasoning_end].strip()
 
-                final_response = original_response[:reasoning_start].rstrip() + "\n\n**Prescriber**: Dr. AI Medic. MD\n---"
-
-                text_to_speech(reasoning.replace('e.g.', 'for example').replace('i.e.', 'that is'))
+                text_to_speech(speakable(reasoning), wait=False)
 
-                data = extract_prescription_data(final_response)
-                with open("prescription.json", "w") as f:
-                    json.dump(data, f, indent=2)
-
-                prescription_path = build_pdf("prescription.json")
+                if early_build is not None and early_prefix == original_response[:reasoning_start]:
+                    _, prescription_pdf = early_build.result()
+                else:
+                    _, prescription_pdf = build_prescription(original_response[:reasoning_start])
+                artifacts = get_artifacts()
+                artifacts.put("prescription.pdf", prescription_pdf)
 
                 st.session_state.prescription_ready = True
                 st.success("✅ Prescription generated successfully! Below is the download link.")
-
-                with open(prescription_path, "rb") as f:
-                    st.download_button(
-                        label="📥 Download Prescription PDF",
-                        data=f,
-                        file_name="prescription.pdf",
-                        mime="application/pdf"
-                    )
+                if st.session_state.get("time_saved"):
+                    st.caption(f"Processing uploads in the background saved {st.session_state.time_saved:.1f}s.")
+
+                st.download_button(
+                    label="📥 Download Prescription PDF",
+                    data=artifacts.get("prescription.pdf"),
+                    file_name="prescription.pdf",
+                    mime="application/pdf"
+                )
 
 if __name__ == "__main__":
     app()
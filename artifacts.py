@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+
+import config
+
+
+def _remove_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+# Files produced during one session (the prescription PDF), kept as bytes in
+# memory. An artifact larger than `spill_bytes` is written to a temp directory
+# owned by the session and removed with it.
+class ArtifactStore:
+    def __init__(self, spill_bytes=None):
+        self.spill_bytes = config.ARTIFACT_SPILL_MB * 2 ** 20 if spill_bytes is None else spill_bytes
+        self._memory = {}
+        self._files = {}
+        self._dir = None
+        self._finalizer = None
+        self._lock = threading.Lock()
+
+    def _directory(self):
+        if self._dir is None:
+            self._dir = tempfile.mkdtemp(prefix="ai-doctor-")
+            self._finalizer = weakref.finalize(self, _remove_dir, self._dir)
+        return self._dir
+
+    def _spill(self, name, data):
+        path = os.path.join(self._directory(), os.path.basename(name))
+        with open(path, "wb") as f:
+            f.write(data)
+        self._files[name] = path
+        return path
+
+    def put(self, name, data):
+        data = bytes(data)
+        with self._lock:
+            self._memory.pop(name, None)
+            self._files.pop(name, None)
+            if len(data) > self.spill_bytes:
+                self._spill(name, data)
+            else:
+                self._memory[name] = data
+
+    def get(self, name):
+        with self._lock:
+            if name in self._memory:
+                return self._memory[name]
+            path = self._files[name]
+        with open(path, "rb") as f:
+            return f.read()
@@ -0,0 +1,1291 @@
+import argparse
+import glob
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def collect_files(paths, patterns):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in patterns:
+                files.extend(glob.glob(os.path.join(path, pattern)))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def print_table(header, rows):
+    widths = [max(len(str(r[i])) for r in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(str(v).rjust(w) for v, w in zip(row, widths)))
+
+
+def bench_fracture_batch(args):
+    import detect_fracture
+
+    images = collect_files(args.images, ["*.jpg", "*.jpeg", "*.png"])
+    if not images:
+        raise SystemExit("No X-ray images found.")
+    total = max(args.count, len(images))
+    work = [images[i % len(images)] for i in range(total)]
+
+    # warm up graph tracing so the first batch size isn't penalised
+    detect_fracture.predict_fracture_batch(work[:1])
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, total, batch_size):
+            detect_fracture.predict_fracture_batch(work[i:i + batch_size])
+        elapsed = time.perf_counter() - start
+        rows.append(["batch", batch_size, total, f"{elapsed:.2f}", f"{total / elapsed:.1f}"])
+
+    # concurrent single-image callers going through the micro-batching queue
+    for batch_size in args.batch_sizes:
+        batcher = detect_fracture.FractureBatcher(max_batch_size=batch_size, max_wait_ms=args.max_wait_ms)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            list(pool.map(batcher.predict, work))
+        elapsed = time.perf_counter() - start
+        rows.append(["queue", batch_size, total, f"{elapsed:.2f}", f"{total / elapsed:.1f}"])
+
+    print_table(["mode", "batch", "images", "seconds", "images/s"], rows)
+
+
+def bench_fracture_parity(args):
+    import numpy as np
+    import detect_fracture
+
+    images = collect_files(args.images, ["*.jpg", "*.jpeg", "*.png"])
+    if not images:
+        raise SystemExit("No X-ray images found.")
+    batch = np.stack([detect_fracture.load_image_array(p) for p in images])
+
+    if detect_fracture.get_shared_classifier() is None:
+        raise SystemExit("Shared backbone mode is unavailable for these models.")
+
+    timings = {}
+    outputs = {}
+    for name, shared in [("two-pass", False), ("shared", True)]:
+        detect_fracture.classify_batch(batch[:1], shared=shared)
+        start = time.perf_counter()
+        outputs[name] = detect_fracture.classify_batch(batch, shared=shared)
+        timings[name] = time.perf_counter() - start
+
+    mismatches = [
+        (path, a, b) for path, a, b in zip(images, outputs["two-pass"], outputs["shared"]) if a != b
+    ]
+    for path, a, b in mismatches:
+        print(f"MISMATCH {path}: two-pass={a!r} shared={b!r}")
+    print_table(["mode", "images", "seconds", "ms/image"], [
+        [name, len(images), f"{t:.2f}", f"{1000 * t / len(images):.1f}"] for name, t in timings.items()
+    ])
+    print(f"{len(images) - len(mismatches)}/{len(images)} predictions match")
+    if mismatches:
+        raise SystemExit(1)
+
+
+def bench_fracture_backends(args):
+    import numpy as np
+    import detect_fracture
+    from model_registry import rss_bytes
+
+    images = collect_files(args.images, ["*.jpg", "*.jpeg", "*.png"])
+    if not images:
+        raise SystemExit("No X-ray images found.")
+    batch = np.stack([detect_fracture.load_image_array(p) for p in images])
+
+    def measure(load):
+        rss_before = rss_bytes()
+        start = time.perf_counter()
+        model = load()
+        load_s = time.perf_counter() - start
+        rss_mb = (rss_bytes() - rss_before) / 2 ** 20
+        model.predict(batch[:1], verbose=0)
+        start = time.perf_counter()
+        for i in range(len(batch)):
+            model.predict(batch[i:i + 1], verbose=0)
+        latency_ms = 1000 * (time.perf_counter() - start) / len(batch)
+        return model.predict(batch, verbose=0), load_s, rss_mb, latency_ms
+
+    rows = []
+    failed = False
+    for name in detect_fracture.model_files:
+        reference, load_s, rss_mb, latency_ms = measure(lambda: detect_fracture.load_model(name, "keras"))
+        rows.append([name, "keras", "h5", f"{load_s:.1f}", f"{rss_mb:.0f}", f"{latency_ms:.1f}", "1.000", "0.0000"])
+        for quantization in args.quantization:
+            scores, load_s, rss_mb, latency_ms = measure(
+                lambda: detect_fracture.load_model(name, args.backend, quantization))
+            agreement = np.mean(np.argmax(scores, axis=1) == np.argmax(reference, axis=1))
+            max_diff = np.max(np.abs(scores - reference))
+            failed |= agreement < args.min_agreement
+            rows.append([name, args.backend, quantization, f"{load_s:.1f}", f"{rss_mb:.0f}",
+                         f"{latency_ms:.1f}", f"{agreement:.3f}", f"{max_diff:.4f}"])
+
+    print_table(["model", "backend", "quant", "load s", "+RSS MiB", "ms/image", "top-1 agree", "max |dp|"], rows)
+    if failed:
+        print(f"Top-1 agreement below {args.min_agreement} for at least one export.")
+        raise SystemExit(1)
+
+
+def bench_ocr_workers(args):
+    import ocr
+
+    files = collect_files(args.reports, ["*.jpg", "*.jpeg", "*.png", "*.pdf"])
+    if not files:
+        raise SystemExit("No test report images or PDFs found.")
+    pages = list(ocr.split_pages(files))
+    pages = [pages[i % len(pages)] for i in range(max(args.pages, len(pages)))]
+
+    rows = []
+    for workers in args.workers:
+        pool = ocr.OCRWorkerPool(workers)
+        for future in [pool.submit(page) for page in pages[:workers]]:
+            future.result()
+        start = time.perf_counter()
+        first = None
+        for _ in ocr.iter_ocr_pages(pages, pool=pool):
+            first = first or time.perf_counter() - start
+        elapsed = time.perf_counter() - start
+        rows.append([workers, len(pages), f"{first:.2f}", f"{elapsed:.2f}", f"{len(pages) / elapsed:.2f}"])
+
+    print_table(["workers", "pages", "first page s", "seconds", "pages/s"], rows)
+
+
+def synthetic_report(n_boxes, columns=4, skew=0.0, seed=0):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    n_rows = -(-n_boxes // columns)
+    row = np.repeat(np.arange(n_rows), columns)[:n_boxes]
+    col = np.tile(np.arange(columns), n_rows)[:n_boxes]
+    x_min = col * 250 + rng.integers(0, 6, n_boxes)
+    widths = rng.integers(40, 200, n_boxes)
+    y_min = row * 32 + rng.integers(0, 3, n_boxes) + skew * (x_min + widths / 2)
+    boxes = np.stack([x_min, y_min, x_min + widths, y_min + 22], axis=1)
+    texts = [f"Test{r} {c}" for r, c in zip(row.tolist(), col.tolist())]
+    return texts, boxes.tolist()
+
+
+def bench_layout(args):
+    import mtest_data_parser
+
+    rows = []
+    for n in args.boxes:
+        texts, boxes = synthetic_report(n, skew=args.skew)
+        for detect_columns in (False, True):
+            mtest_data_parser.layout_text(texts[:100], boxes[:100], detect_columns=detect_columns)
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                mtest_data_parser.layout_text(texts, boxes, detect_columns=detect_columns)
+            elapsed = (time.perf_counter() - start) / args.repeat
+            rows.append([n, "columns" if detect_columns else "plain", f"{1000 * elapsed:.1f}",
+                         f"{1e6 * elapsed / n:.2f}"])
+
+    print_table(["boxes", "mode", "ms", "us/box"], rows)
+
+
+LAB_TESTS = [
+    ("Hemoglobin", "g/dL", 13.0, 17.0), ("WBC Count", "x10^9/L", 4.0, 11.0),
+    ("Platelets", "x10^9/L", 150, 400), ("Glucose Fasting", "mg/dL", 70, 100),
+    ("Creatinine", "mg/dL", 0.7, 1.3), ("ALT", "U/L", 7, 56), ("Sodium", "mmol/L", 135, 145),
+    ("Potassium", "mmol/L", 3.5, 5.1), ("TSH", "mIU/L", 0.4, 4.0), ("Vitamin D", "ng/mL", 30, 100),
+]
+
+
+def synthetic_lab_boxes(n_tests, seed=0):
+    # PaddleOCR texts and boxes for a lab report: letterhead, patient block,
+    # then a test / result / unit / range table
+    import random
+
+    rng = random.Random(seed)
+    lines = [["City Diagnostic Laboratory"], ["123 Main Boulevard, Lahore", "Ph: 042-35761234"],
+             ["Patient: Test Patient", "Age/Sex: 30/M", "MR No: 004512"],
+             ["Collected: 01/01/2025 08:15", "Reported: 01/01/2025 14:40"], ["COMPLETE PANEL"],
+             ["Test", "Result", "Unit", "Reference Range"]]
+    for i in range(n_tests):
+        name, unit, low, high = LAB_TESTS[i % len(LAB_TESTS)]
+        value = round(rng.uniform(low * 0.8, high * 1.2), 1)
+        lines.append([name if i < len(LAB_TESTS) else f"{name} ({i // len(LAB_TESTS)})",
+                      str(value), unit, f"{low} - {high}"])
+    lines += [["Verified by: Dr. A. Khan, Consultant Pathologist"], ["This is a computer generated report"],
+              ["Page 1 of 1"]]
+
+    texts, boxes = [], []
+    for row, cells in enumerate(lines):
+        for col, text in enumerate(cells):
+            x = 40 + col * 300
+            texts.append(text)
+            boxes.append([x, 40 + row * 32, x + 9 * len(text), 62 + row * 32])
+    return texts, boxes
+
+
+def synthetic_lab_report(n_tests, seed=0):
+    import mtest_data_parser
+
+    return mtest_data_parser.layout_text(*synthetic_lab_boxes(n_tests, seed))
+
+
+def bench_llm_context(args):
+    import json
+    import context_builder
+    from mtest_data_parser import extract_text_from_json
+
+    if args.reports:
+        reports = [(os.path.basename(p), extract_text_from_json(p)) for p in collect_files(args.reports, ["*.json"])]
+    else:
+        reports = [(f"synthetic {n} tests", synthetic_lab_report(n)) for n in (10, 40, 200)]
+
+    system = [{"role": "system", "content": "You are a professional AI doctor. " * 20} for _ in range(3)]
+    qna = {"role": "user", "content": "Your question: When did the pain start? My answer: two days ago\n" * 8}
+    prompt = {"role": "user", "content": "\n".join("                " + line for line in
+                                                    ["**Medical Prescription**"] + ["- **Name**: [Generic Name]"] * 30)}
+    rows = []
+    for name, report in reports:
+        raw = system + [qna, {"role": "user", "content": context_builder.REPORT_HEADER + report}, prompt]
+        before = context_builder.count_message_tokens(raw)
+        for relevant_only in (False, True):
+            messages = system + [qna, context_builder.report_message(report, relevant_only), prompt]
+            start = time.perf_counter()
+            fitted = context_builder.build_context(messages, args.budget)
+            elapsed = time.perf_counter() - start
+            after = context_builder.count_message_tokens(fitted)
+            rows.append([name, "relevant rows" if relevant_only else "all rows", before, after,
+                         f"{1 - after / before:.0%}", f"{1000 * elapsed:.1f}"])
+
+    print_table(["report", "mode", "tokens before", "tokens after", "saved", "ms"], rows)
+    print(json.dumps({"tokenizer": "tiktoken" if context_builder._encoding() else "chars/4"}))
+
+
+def bench_stt_latency(args):
+    import numpy as np
+    from silero_vad import load_silero_vad, get_speech_timestamps
+    import stt
+    import transcribers
+
+    wavs = collect_files(args.wavs, ["*.wav"])
+    if not wavs:
+        raise SystemExit("No WAV files found.")
+    model = transcribers.load_transcriber(args.backend, args.model)
+    vad = load_silero_vad()
+
+    def fixed_capture(source):
+        # what sd.rec does: keep recording for the whole timeout
+        blocks = []
+        while (block := source.read()) is not None:
+            blocks.append(block)
+        remaining = source.time_at(int(args.timeout * source.sample_rate)) - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        return np.concatenate(blocks)
+
+    rows = []
+    for path in wavs:
+        for mode in ("fixed", "streaming"):
+            source = stt.WavFileSource(path, realtime=True)
+            wav = source.audio.astype(np.float32) / 32768.0
+            speech = get_speech_timestamps(wav, vad, sampling_rate=source.sample_rate)
+            speech_end = speech[-1]["end"] if speech else len(wav)
+            with source:
+                audio = stt.capture_utterance(source, vad) if mode == "streaming" else fixed_capture(source)
+                captured = time.monotonic()
+                text = stt.transcribe_audio(model, audio)
+                done = time.monotonic()
+            rows.append([os.path.basename(path), mode, f"{captured - source.time_at(speech_end):.2f}",
+                         f"{done - captured:.2f}", f"{done - source.time_at(speech_end):.2f}", text.strip()[:40]])
+
+    print_table(["file", "mode", "capture tail s", "transcribe s", "speech end -> text s", "text"], rows)
+
+
+def bench_vad(args):
+    import tracemalloc
+    import numpy as np
+    from silero_vad import load_silero_vad, get_speech_timestamps
+    import stt
+
+    def legacy(audio_int16, sample_rate=16000, padding_ms=200):
+        # extract_all_voice_with_padding before VadEngine
+        vad_model = load_silero_vad()
+        wav = audio_int16.astype(np.float32) / 32768.0
+        speech_ts = get_speech_timestamps(wav, vad_model, sampling_rate=sample_rate)
+        if not speech_ts:
+            return np.array([], dtype=np.float32)
+        padding = int(sample_rate * (padding_ms / 1000))
+        return np.concatenate([wav[max(0, s['start'] - padding):min(len(wav), s['end'] + padding)]
+                               for s in speech_ts])
+
+    wavs = collect_files(args.wavs, ["*.wav"])
+    if not wavs:
+        raise SystemExit("No WAV files found.")
+    clips = [stt.WavFileSource(path).audio for path in wavs]
+    engine = stt.get_vad_engine()
+
+    rows = []
+    for name, fn in [("legacy", legacy), ("engine", engine.extract_voice)]:
+        fn(clips[0])
+        latencies, peaks, voiced = [], [], 0
+        for _ in range(args.repeat):
+            for clip in clips:
+                tracemalloc.start()
+                start = time.perf_counter()
+                voiced += len(fn(clip))
+                latencies.append(time.perf_counter() - start)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        rows.append([name, len(latencies), f"{1000 * np.mean(latencies):.1f}", f"{1000 * np.max(latencies):.1f}",
+                     f"{np.mean(peaks) / 2 ** 20:.2f}", voiced // args.repeat])
+
+    print_table(["impl", "calls", "mean ms", "max ms", "peak alloc MiB", "voiced samples"], rows)
+
+    # two utterances with a short pause: padded segments must merge, never overlap
+    wav = clips[0].astype(np.float32) / 32768.0
+    speech_ts = get_speech_timestamps(wav, load_silero_vad(), sampling_rate=16000)
+    if not speech_ts:
+        raise SystemExit(f"No speech found in {wavs[0]}.")
+    utterance = clips[0][speech_ts[0]["start"]:speech_ts[-1]["end"]]
+    silence = lambda ms: np.zeros(16 * ms, dtype=np.int16)
+    overlaps = 0
+    for pause_ms in args.pauses:
+        audio = np.concatenate([silence(500), utterance, silence(pause_ms), utterance, silence(500)])
+        with engine.stream() as vad:
+            for i in range(0, len(audio), 1600):
+                vad.feed(audio[i:i + 1600])
+            vad.flush()
+        overlapping = [(a, b) for a, b in zip(vad.spans, vad.spans[1:]) if a[1] > b[0]]
+        overlaps += len(overlapping)
+        print(f"pause {pause_ms} ms: spans {vad.spans}" + (f" OVERLAP {overlapping}" if overlapping else ""))
+    if overlaps:
+        raise SystemExit(1)
+
+
+def word_errors(reference, hypothesis):
+    # (word-level edit distance, reference length) after lowercasing and
+    # dropping punctuation
+    def words(text):
+        return "".join(c if c.isalnum() or c.isspace() or c == "'" else " " for c in text.lower()).split()
+
+    ref, hyp = words(reference), words(hypothesis)
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1], len(ref)
+
+
+def bench_stt_wer(args):
+    import stt
+    import transcribers
+
+    wavs = [p for p in collect_files(args.fixtures, ["*.wav"]) if os.path.exists(os.path.splitext(p)[0] + ".txt")]
+    if not wavs:
+        raise SystemExit("No WAV files with matching .txt transcripts found.")
+    clips = []
+    for path in wavs:
+        with open(os.path.splitext(path)[0] + ".txt") as f:
+            clips.append((stt.WavFileSource(path).audio.astype("float32") / 32768.0, f.read()))
+    audio_seconds = sum(len(audio) for audio, _ in clips) / 16000
+
+    rows = []
+    for spec in args.candidates:
+        backend, _, model = spec.partition(":")
+        start = time.perf_counter()
+        transcriber = transcribers.load_transcriber(backend, model or None)
+        load_s = time.perf_counter() - start
+        transcriber.transcribe(clips[0][0][:16000])
+
+        errors = ref_words = 0
+        start = time.perf_counter()
+        for audio, reference in clips:
+            e, n = word_errors(reference, transcriber.transcribe(audio))
+            errors += e
+            ref_words += n
+        elapsed = time.perf_counter() - start
+        rows.append([spec, f"{load_s:.1f}", f"{elapsed:.1f}", f"{elapsed / audio_seconds:.3f}",
+                     f"{100 * errors / max(ref_words, 1):.1f}"])
+        del transcriber
+
+    print(f"{len(clips)} clips, {audio_seconds:.0f}s of audio")
+    print_table(["backend:model", "load s", "transcribe s", "RTF", "WER %"], rows)
+
+
+def bench_tts_engines(args):
+    import statistics
+    import tts_engines
+
+    texts = args.texts or [
+        "You can speak now...",
+        "Please describe your symptoms. Please speak when told to do so.",
+        "How long have you had this pain, and does it get worse when you move your arm?",
+        "Have you taken any medication for it so far?",
+    ]
+    rows = []
+    for name in args.engines:
+        try:
+            engine = tts_engines.load_engine(name)
+        except Exception as e:
+            rows.append([name, "-", "-", "-", f"unavailable: {e}"])
+            continue
+        # synthesis is uncached here, so each run is the real time to first audio
+        times = []
+        audio_bytes = 0
+        for _ in range(args.repeat):
+            for text in texts:
+                start = time.perf_counter()
+                audio_bytes += len(engine.synthesize(text))
+                times.append(time.perf_counter() - start)
+        times.sort()
+        rows.append([name, f"{1000 * statistics.mean(times):.0f}", f"{1000 * times[len(times) // 2]:.0f}",
+                     f"{1000 * times[int(0.95 * (len(times) - 1))]:.0f}", f"{audio_bytes // len(times)} B/utterance"])
+
+    print_table(["engine", "mean ms", "p50 ms", "p95 ms", "notes"], rows)
+
+
+def stream_chat(client, messages, model, max_tokens=10000):
+    # content deltas of a plain OpenAI client stream (the blocking-vs-streaming baseline)
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        stream=True,
+    )
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+def bench_llm_stream(args):
+    from openai import OpenAI
+    from llm_streaming import QuestionSplitter, SectionSplitter
+    from mock_llm_server import MockLLMServer
+
+    requests = [
+        ("questions", [{"role": "user", "content": "I am experiencing elbow pain"}]),
+        ("prescription", [{"role": "user", "content": "Generate a complete medical prescription"}]),
+    ]
+    rows = []
+    with MockLLMServer(first_token_delay=args.first_token_delay, token_delay=args.token_delay) as server:
+        client = OpenAI(base_url=server.base_url, api_key="mock")
+        for kind, messages in requests:
+            start = time.perf_counter()
+            client.chat.completions.create(model="mock", messages=messages, max_tokens=10000)
+            total = time.perf_counter() - start
+            rows.append([kind, "blocking", f"{total:.2f}", f"{total:.2f}", f"{total:.2f}"])
+
+            # time to first question, or until the PDF can start building (**Reasoning** begins)
+            start = time.perf_counter()
+            first_token = usable = None
+            questions, sections = QuestionSplitter(), SectionSplitter()
+            for delta in stream_chat(client, messages, "mock"):
+                now = time.perf_counter() - start
+                first_token = first_token or now
+                if usable is None:
+                    if kind == "questions" and questions.feed(delta):
+                        usable = now
+                    elif kind == "prescription":
+                        sections.feed(delta)
+                        if "Reasoning" in sections.starts:
+                            usable = now
+            total = time.perf_counter() - start
+            rows.append([kind, "streaming", f"{first_token:.2f}", f"{(usable or total):.2f}", f"{total:.2f}"])
+
+    print_table(["request", "mode", "first token s", "first question / PDF start s", "total s"], rows)
+
+
+def bench_llm_load(args):
+    import asyncio
+    from openai import OpenAI
+    from llm_client import LLMPool
+    from mock_llm_server import MockLLMServer
+
+    questions = [{"role": "user", "content": "I am experiencing elbow pain"}]
+    prescription = [{"role": "user", "content": "Generate a complete medical prescription"}]
+
+    def pct(values, p):
+        values = sorted(values)
+        return f"{values[int(p * (len(values) - 1))]:.2f}" if values else "-"
+
+    rows = []
+    with MockLLMServer(first_token_delay=args.first_token_delay, token_delay=args.token_delay,
+                       jitter=args.jitter, error_rate=args.error_rate) as server:
+        # before: a sync client per session thread, openai's default retries, no limit
+        def session(_):
+            client = OpenAI(base_url=server.base_url, api_key="mock", timeout=args.timeout)
+            start = time.perf_counter()
+            try:
+                client.chat.completions.create(model="mock", messages=questions)
+                stream = client.chat.completions.create(model="mock", messages=prescription, stream=True)
+                for _ in stream:
+                    pass
+                return True, time.perf_counter() - start
+            except Exception:
+                return False, time.perf_counter() - start
+
+        server.requests = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.sessions) as pool:
+            results = list(pool.map(session, range(args.sessions)))
+        wall = time.perf_counter() - start
+        ok = [t for success, t in results if success]
+        rows.append(["per-session client", f"{len(ok)}/{args.sessions}", pct(ok, 0.5), pct(ok, 0.95),
+                     "-", server.requests, f"{len(ok) / wall:.1f}"])
+
+        llm = LLMPool(server.base_url, "mock", max_concurrency=args.concurrency, timeout=args.timeout,
+                      max_retries=args.retries, backoff=0.2)
+
+        async def pooled_session():
+            start = time.perf_counter()
+            try:
+                await llm.acomplete(questions, "mock")
+                async for _ in llm.astream(prescription, "mock"):
+                    pass
+                return True, time.perf_counter() - start
+            except Exception:
+                return False, time.perf_counter() - start
+
+        async def run_all():
+            return await asyncio.gather(*(pooled_session() for _ in range(args.sessions)))
+
+        server.requests = 0
+        start = time.perf_counter()
+        results = llm._run(run_all())
+        wall = time.perf_counter() - start
+        ok = [t for success, t in results if success]
+        summary = llm.summary()
+        rows.append([f"pool ({args.concurrency} in flight)", f"{len(ok)}/{args.sessions}", pct(ok, 0.5),
+                     pct(ok, 0.95), f"{summary['queue_wait_p95']:.2f}", server.requests, f"{len(ok) / wall:.1f}"])
+
+    print_table(["client", "sessions ok", "p50 s", "p95 s", "p95 queue s", "HTTP requests", "sessions/s"], rows)
+
+
+def bench_llm_cache(args):
+    from llm_cache import new_response_cache
+    from llm_client import LLMPool
+    from mock_llm_server import MockLLMServer
+
+    # every session asks for one of `distinct` prescriptions and some double-click
+    sessions = [[{"role": "user", "content": f"Patient {i % args.distinct}: generate a medical prescription"}]
+                for i in range(args.sessions)]
+    sessions += sessions[:int(args.sessions * args.double_click)]
+    rows = []
+    with MockLLMServer(first_token_delay=args.first_token_delay, token_delay=args.token_delay) as server:
+        llm = LLMPool(server.base_url, "mock", max_concurrency=args.concurrency)
+        for backend in ["none"] + args.backends:
+            cache = None if backend == "none" else new_response_cache(backend)
+
+            def session(messages):
+                call = lambda: llm.stream(messages, "mock")
+                return "".join(cache.stream("mock", messages, {}, call) if cache else call())
+
+            server.requests = 0
+            start = time.perf_counter()
+            with ThreadPoolExecutor(len(sessions)) as pool:
+                list(pool.map(session, sessions))
+            wall = time.perf_counter() - start
+            stats = cache.stats() if cache else {"hits": 0, "joined": 0}
+            rows.append([backend, len(sessions), server.requests, stats["hits"], stats["joined"], f"{wall:.2f}"])
+
+    print_table(["cache", "requests", "upstream calls", "hits", "joined", "wall s"], rows)
+
+
+def synthetic_prescription(n_items, seed=0):
+    # prescription dict with n medications, recommendations and tests
+    import random
+
+    rng = random.Random(seed)
+    words = "take with food avoid alcohol rest drink water daily review after one week if symptoms persist".split()
+
+    def sentence(n):
+        return " ".join(rng.choice(words) for _ in range(n)).capitalize() + "."
+
+    return {
+        "patient_info": {"name": "Test Patient", "age": 30, "gender": "Male", "date": "January 01, 2025"},
+        "diagnosis": sentence(rng.randint(5, 40)),
+        "medication": [{"name": f"Medicine {i}", "brand_names": [], "dosage_and_route": "500mg orally",
+                        "frequency_and_duration": "Twice a day for 5 days", "refills": "None",
+                        "special_instructions": sentence(rng.randint(3, 15))} for i in range(n_items)],
+        "non_pharmacological_recommendations": [{"title": f"Advice {i}", "details": {"text": sentence(rng.randint(4, 20))}}
+                                                for i in range(n_items)],
+        "medical_tests": [{"test_name": f"Test {i}", "details": {"text": sentence(rng.randint(2, 10))}}
+                          for i in range(n_items)],
+        "prescriber": {"name": "Dr. AI Medic. MD"},
+    }
+
+
+def bench_pdf_render(args):
+    import contextlib
+    import io
+    from PyPDF2 import PdfReader
+    from pdf_builder import build_pdf
+
+    def layout(pdf):
+        reader = PdfReader(io.BytesIO(pdf))
+        return len(reader.pages), "General Instructions" in "".join(p.extract_text() for p in reader.pages)
+
+    rows = []
+    mismatches = 0
+    for n in args.items:
+        for seed in range(args.seeds):
+            data = synthetic_prescription(n, seed)
+            timings = {}
+            for single_pass in (False, True):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    for _ in range(args.repeat):
+                        pdf = build_pdf(data, single_pass=single_pass)
+                timings[single_pass] = ((time.perf_counter() - start) / args.repeat, layout(pdf))
+            (legacy_s, legacy_layout), (single_s, single_layout) = timings[False], timings[True]
+            mismatches += legacy_layout != single_layout
+            if seed == 0:
+                pages, instructions = single_layout
+                rows.append([n, pages, "yes" if instructions else "no", f"{1000 * legacy_s:.1f}",
+                             f"{1000 * single_s:.1f}", f"{legacy_s / single_s:.2f}x"])
+
+    print_table(["items", "pages", "instructions", "two-pass ms", "single-pass ms", "speedup"], rows)
+    print(f"layout mismatches: {mismatches}/{len(args.items) * args.seeds}")
+
+
+def bench_pdf_throughput(args):
+    import contextlib
+    import io
+    from PyPDF2 import PdfReader
+    from pdf_builder import PrescriptionTemplate, build_pdf
+
+    def text(pdf):
+        return "".join(p.extract_text() for p in PdfReader(io.BytesIO(pdf)).pages)
+
+    prescriptions = [synthetic_prescription(1 + i % 6, seed=i) for i in range(args.count)]
+    modes = [("template per call", lambda data: build_pdf(data, template=PrescriptionTemplate())),
+             ("cached template", build_pdf)]
+    rows = []
+    outputs = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, render in modes:
+            for workers in args.workers:
+                start = time.perf_counter()
+                with ThreadPoolExecutor(workers) as pool:
+                    pdfs = list(pool.map(render, prescriptions))
+                elapsed = time.perf_counter() - start
+                outputs.setdefault(name, pdfs)
+                rows.append([name, workers, f"{args.count / elapsed:.1f}", f"{1000 * elapsed / args.count:.1f}"])
+
+    print_table(["mode", "threads", "prescriptions/s", "ms each"], rows)
+    fresh, cached = outputs["template per call"], outputs["cached template"]
+    mismatches = sum(text(a) != text(b) for a, b in zip(fresh, cached))
+    print(f"text mismatches vs a fresh template: {mismatches}/{args.count}")
+
+
+MARKER_SNIPPETS = ["**Medication**", "**Medication**:", "**Non-Pharmacological Recommendations**",
+                   "**Medical Tests Recommended**:", "**Follow-Up**", "**Prescriber**:", "**prescriber**:",
+                   "**Diagnosis**:", "**DATE**:", "**Patient Information**:", "**Name**:", ", 40 years old",
+                   "Gender: ", "\n", "\r\n", "- ", "1. ", "***", ":", "Not applicable"]
+
+
+def mutate_prescription(text, rng):
+    # malformed variants of an LLM response: cut, reordered, duplicated or spliced lines and markers
+    for _ in range(rng.randint(1, 4)):
+        lines = text.split("\n")
+        op = rng.randrange(7)
+        if op == 0:
+            text = text[:rng.randint(0, len(text))]
+        elif op == 1 and len(lines) > 1:
+            del lines[rng.randrange(len(lines))]
+            text = "\n".join(lines)
+        elif op == 2:
+            i = rng.randrange(len(lines))
+            lines[i:i] = [lines[rng.randrange(len(lines))]]
+            text = "\n".join(lines)
+        elif op == 3 and len(lines) > 1:
+            i, j = rng.randrange(len(lines)), rng.randrange(len(lines))
+            lines[i], lines[j] = lines[j], lines[i]
+            text = "\n".join(lines)
+        elif op == 4:
+            i = rng.randint(0, len(text))
+            text = text[:i] + rng.choice(MARKER_SNIPPETS) + text[i:]
+        elif op == 5:
+            text = text.upper() if rng.random() < 0.2 else text.replace("**", rng.choice(["*", "***", "** ", ""]), 1)
+        else:
+            text = text.replace(rng.choice([":", "\n", " "]), "", rng.randint(1, 3))
+    return text
+
+
+def large_prescription(n_meds):
+    meds = "".join(f"{i}. **Name**: Medicine {i} (Brand {i})\n   - **Dosage and Route**: {i}mg orally\n"
+                   f"   - **Frequency and Duration**: Twice a day for {i} days\n   - **Refills**: None\n"
+                   f"   - **Special Instructions**: Take with food\n" for i in range(1, n_meds + 1))
+    recs = "".join(f"- **Advice {i}**: Detail number {i}\n" for i in range(n_meds))
+    return ("---\n**Medical Prescription**\n\n**Patient Information**: Test Patient, 30 years old, Gender: Male\n"
+            "**Date**: January 01, 2025\n\n**Diagnosis**: Test diagnosis\n\n**Medication**:\n" + meds +
+            "\n**Non-Pharmacological Recommendations**\n" + recs + "\n**Medical Tests Recommended**\n" + recs +
+            "\n**Prescriber**: Dr. AI Medic. MD\n---")
+
+
+# The original json_builder parser: a separate regex scan per field and
+# section. The reference that the fuzzed prescriptions are compared against.
+def legacy_extract_prescription_data(text):
+    def extract_field(pattern, source=None, default=""):
+        src = source if source else text
+        match = re.search(pattern, src, re.IGNORECASE | re.DOTALL)
+        return match.group(1).strip() if match else default
+
+    def extract_medications(section):
+        if not section or "Not applicable" in section or "No medication prescribed" in section:
+            return []
+
+        meds = []
+        med_blocks = re.split(r"(?:\n|^)\s*(?:\d+[\.\)]|\-|\*)\s*(?=\*\*Name\*\*:)", section.strip())
+
+        for block in med_blocks:
+            block = block.strip()
+            if not block:
+                continue
+
+            if not block.startswith("**Name**:"):
+                block = "**Name**: " + block
+
+            raw_name = extract_field(r"\*\*Name\*\*:\s*(.+?)(\n|$)", block)
+            cleaned_name = re.sub(r"^\d+[\.\)]\s*", "", raw_name).strip()
+
+            dosage = extract_field(r"\*\*Dosage and Route\*\*:\s*(.+?)(\n|$)", block)
+            freq = extract_field(r"\*\*Frequency and Duration\*\*:\s*(.+?)(\n|$)", block)
+            refills = extract_field(r"\*\*Refills\*\*:\s*(.+?)(\n|$)", block)
+
+            instr_match = re.search(r"\*\*(?:Special Instructions|Special Instructions or Warnings)\*\*:\s*(.+?)(\n|$)", block)
+            instructions = instr_match.group(1).strip() if instr_match else ""
+
+            meds.append({
+                "name": cleaned_name,
+                "brand_names": [],
+                "dosage_and_route": dosage,
+                "frequency_and_duration": freq,
+                "refills": refills,
+                "special_instructions": instructions
+            })
+
+        return meds
+
+    def extract_non_pharm_recommendations(section):
+        if not section:
+            return []
+        recommendations = []
+        lines = section.strip().split("\n")
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            match = re.match(r"^(?:\d+[\.\)]|\-|\*)\s*(\*\*(.+?)\*\*:)?\s*(.+)", line)
+            if match:
+                title = match.group(2).strip() if match.group(2) else match.group(3).strip()
+                detail = match.group(3).strip()
+                recommendations.append({
+                    "title": title,
+                    "details": {"text": detail}
+                })
+        return recommendations
+
+    def extract_medical_tests(section):
+        if not section:
+            return []
+        tests = []
+        lines = section.strip().split("\n")
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            match = re.match(r"^(?:\d+[\.\)]|\-|\*)\s*(\*\*(.+?)\*\*:)?\s*(.+)", line)
+            if match:
+                title = match.group(2).strip() if match.group(2) else match.group(3).strip()
+                detail = match.group(3).strip()
+                tests.append({
+                    "test_name": title,
+                    "details": {"text": detail}
+                })
+        return tests
+
+    patient_info = {
+        "name": extract_field(r"\*\*Patient Information\*\*:\s*([\w\s]+),"),
+        "age": int(extract_field(r",\s*(\d+)\s*years? old", default="0")),
+        "gender": extract_field(r"Gender:\s*([A-Za-z]+)"),
+        "date": extract_field(r"\*\*Date\*\*:\s*(.+?)(?=\n\*\*|$)", default="")
+    }
+
+    diagnosis = extract_field(r"\*\*Diagnosis\*\*:\s*(.*?)(?=\n\*\*|$)")
+
+    med_match = re.search(
+        r"\*\*Medication\*\*:?(.*?)(\*\*Non-Pharmacological Recommendations\*\*|\*\*Medical Tests Recommended\*\*|\*\*Follow-Up\*\*|\*\*Prescriber\*\*|$)",
+        text,
+        re.DOTALL
+    )
+    medications = extract_medications(med_match.group(1)) if med_match else []
+
+    non_pharm_match = re.search(
+        r"\*\*Non-Pharmacological Recommendations\*\*:?(.*?)(\*\*Medical Tests Recommended\*\*|\*\*Follow-Up\*\*|\*\*Prescriber\*\*|$)",
+        text,
+        re.DOTALL
+    )
+    non_pharm_recs = extract_non_pharm_recommendations(non_pharm_match.group(1)) if non_pharm_match else []
+
+    test_match = re.search(
+        r"\*\*Medical Tests Recommended\*\*:?(.*?)(\*\*Follow-Up\*\*|\*\*Prescriber\*\*|$)",
+        text,
+        re.DOTALL
+    )
+    medical_tests = extract_medical_tests(test_match.group(1)) if test_match else []
+
+    prescriber = extract_field(r"\*\*Prescriber\*\*:\s*(.+?)(?=\n|$)").rstrip("-").strip()
+
+    return {
+        "patient_info": patient_info,
+        "diagnosis": diagnosis,
+        "medication": medications,
+        "non_pharmacological_recommendations": non_pharm_recs,
+        "medical_tests": medical_tests,
+        "prescriber": {
+            "name": prescriber
+        }
+    }
+
+
+def bench_prescription_parser(args):
+    import json
+    import random
+    from json_builder import extract_prescription_data
+
+    failed = False
+    golden = sorted(glob.glob(os.path.join(args.fixtures, "*.txt")))
+    mismatches = []
+    for path in golden:
+        with open(path, newline="") as f:
+            text = f.read()
+        with open(os.path.splitext(path)[0] + ".json") as f:
+            expected = json.load(f)
+        if extract_prescription_data(text) != expected:
+            mismatches.append(os.path.basename(path))
+    print(f"golden corpus: {len(golden) - len(mismatches)}/{len(golden)} match"
+          + (f" (mismatched: {', '.join(mismatches)})" if mismatches else ""))
+    failed |= bool(mismatches) or not golden
+
+    rng = random.Random(args.seed)
+    corpus = []
+    for path in golden:
+        with open(path, newline="") as f:
+            corpus.append(f.read())
+    corpus = corpus or [large_prescription(3)]
+    fuzz_failures = 0
+    for i in range(args.fuzz):
+        text = mutate_prescription(rng.choice(corpus), rng)
+        if extract_prescription_data(text) != legacy_extract_prescription_data(text):
+            fuzz_failures += 1
+            if fuzz_failures == 1:
+                print(f"first fuzz mismatch (case {i}):\n{text!r}")
+    print(f"fuzzed outputs: {args.fuzz - fuzz_failures}/{args.fuzz} identical to the legacy parser")
+    failed |= fuzz_failures > 0
+
+    rows = []
+    for n in args.sizes:
+        text = large_prescription(n)
+        timings = []
+        for parse in (legacy_extract_prescription_data, extract_prescription_data):
+            repeat = max(1, args.repeat // n)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                parse(text)
+            timings.append((time.perf_counter() - start) / repeat)
+        rows.append([n, len(text), f"{1000 * timings[0]:.2f}", f"{1000 * timings[1]:.2f}",
+                     f"{timings[0] / timings[1]:.2f}x"])
+    print_table(["medications", "chars", "legacy ms", "single-pass ms", "speedup"], rows)
+
+    if failed:
+        raise SystemExit(1)
+
+
+def synthetic_xray(size=512, seed=0):
+    # grey noise with two bright "bones", PNG-encoded
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    img = rng.normal(60, 15, (size, size)).clip(0, 255).astype(np.uint8)
+    cv2.rectangle(img, (size // 3, 40), (size // 3 + 40, size - 40), 220, -1)
+    cv2.rectangle(img, (size // 2, 60), (size // 2 + 30, size - 60), 200, -1)
+    return cv2.imencode(".png", cv2.cvtColor(img, cv2.COLOR_GRAY2BGR))[1].tobytes()
+
+
+def synthetic_report_image(n_tests=12):
+    # the OCR fixture's lines drawn on a white page, PNG-encoded
+    import cv2
+    import numpy as np
+
+    texts, boxes = synthetic_lab_boxes(n_tests)
+    height = int(max(b[3] for b in boxes)) + 40
+    img = np.full((height, 1300, 3), 255, np.uint8)
+    for text, (x0, y0, x1, y1) in zip(texts, boxes):
+        cv2.putText(img, text, (int(x0), int(y1)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1, cv2.LINE_AA)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+def synthetic_speech_wav(path, seconds=3.0, sample_rate=16000):
+    # voiced-sounding bursts (harmonics with a syllable envelope) between pauses
+    import wave
+    import numpy as np
+
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 120 + 20 * np.sin(2 * np.pi * 0.5 * t)
+    voice = sum(np.sin(2 * np.pi * k * np.cumsum(pitch) / sample_rate) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) * ((t > 0.5) & (t < seconds - 0.8))
+    audio = (0.3 * voice * envelope * 32767 / 2).astype(np.int16)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(audio.tobytes())
+    return path
+
+
+def peak_rss_mb():
+    # high-water mark of the whole process so far, not of any one stage
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# missing optional dependencies or model files skip a stage instead of failing the run
+SKIPPABLE = (ImportError, OSError)
+
+
+def bench_pipeline(args):
+    import contextlib
+    import io
+    import json
+    import shutil
+    import statistics
+    import tempfile
+
+    tmp = tempfile.mkdtemp(prefix="pipeline-bench-")
+    wavs = collect_files(args.wavs, ["*.wav"]) if args.wavs else [synthetic_speech_wav(os.path.join(tmp, "speech.wav"))]
+    # inputs of later stages, so that any subset of stages can run on its own
+    from mock_llm_server import PRESCRIPTION_RESPONSE
+    from json_builder import extract_prescription_data
+    state = {"response": PRESCRIPTION_RESPONSE,
+             "data": extract_prescription_data(PRESCRIPTION_RESPONSE[:PRESCRIPTION_RESPONSE.find("**Reasoning**")])}
+
+    def xray():
+        from detect_fracture import predict_fracture
+        if "xray" not in state:
+            state["xray"] = synthetic_xray()
+        return lambda: predict_fracture(io.BytesIO(state["xray"]))
+
+    def ocr():
+        # the app's path: pages go through the shared OCR worker pool
+        from ocr import ocr_report_text
+        if "report" not in state:
+            state["report"] = synthetic_report_image()
+        return lambda: ocr_report_text([state["report"]])
+
+    def layout():
+        from mtest_data_parser import extract_text_from_json
+        return lambda: state.__setitem__("report_text", extract_text_from_json(args.ocr_json))
+
+    def llm_questions():
+        from llm_client import LLMPool
+        from llm_streaming import QuestionSplitter
+        from context_builder import build_context
+
+        def run():
+            messages = build_context([{"role": "user", "content": "I am experiencing elbow pain"}])
+            splitter = QuestionSplitter()
+            questions = [q for delta in state["llm"].stream(messages, "mock") for q in splitter.feed(delta)]
+            return questions + splitter.close()
+        return run
+
+    def llm_prescription():
+        from context_builder import build_context, report_message
+
+        def run():
+            messages = [{"role": "user", "content": "Your question: When did the pain start? My answer: yesterday"}]
+            messages.append(report_message(state.get("report_text", "")))
+            messages.append({"role": "user", "content": "Generate a complete medical prescription"})
+            state["response"] = "".join(state["llm"].stream(build_context(messages), "mock"))
+        return run
+
+    def parse():
+        return lambda: state.__setitem__("data", extract_prescription_data(
+            state["response"][:state["response"].find("**Reasoning**")]))
+
+    def pdf():
+        from pdf_builder import build_pdf
+        return lambda: build_pdf(state["data"])
+
+    def tts():
+        from tts_engines import load_engine
+        engine = load_engine(args.tts_engine)
+        reasoning = state["response"][state["response"].find("**Reasoning**"):]
+        return lambda: engine.synthesize(reasoning)
+
+    def stt():
+        import stt as stt_module
+        import transcribers  # noqa: F401  (registers the transcriber)
+        from model_registry import registry
+
+        def run():
+            model = registry.get("transcriber")
+            texts = []
+            for path in wavs:
+                with stt_module.WavFileSource(path) as source, stt_module.get_vad_engine().model() as vad_model:
+                    audio = stt_module.capture_utterance(source, vad_model)
+                texts.append(stt_module.transcribe_audio(model, audio))
+            return texts
+        return run
+
+    stages = [("predict_fracture", xray), ("ocr_report_text", ocr), ("extract_text_from_json", layout),
+              ("ask_ai questions", llm_questions), ("ask_ai prescription", llm_prescription),
+              ("extract_prescription_data", parse), ("build_pdf", pdf), ("text_to_speech", tts),
+              ("speech_to_text", stt)]
+    if args.stages:
+        stages = [s for s in stages if s[0] in args.stages]
+
+    from mock_llm_server import MockLLMServer
+    from llm_client import LLMPool
+
+    from model_registry import rss_bytes
+
+    timings = {name: [] for name, _ in stages}
+    # current-RSS growth over each stage's cold run (model loads, caches)
+    rss_growth = {}
+    skipped = {}
+    failed = {}
+    try:
+        with MockLLMServer(first_token_delay=args.first_token_delay, token_delay=args.token_delay) as server:
+            state["llm"] = LLMPool(server.base_url, "mock")
+            for run in range(args.warmup + args.repeat):
+                for name, setup in stages:
+                    if name in skipped or name in failed:
+                        continue
+                    try:
+                        rss_before = rss_bytes()
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            call = setup()
+                            start = time.perf_counter()
+                            call()
+                            elapsed = time.perf_counter() - start
+                    except SKIPPABLE as e:
+                        skipped[name] = f"{type(e).__name__}: {e}".splitlines()[0][:60]
+                        continue
+                    except Exception as e:
+                        failed[name] = f"{type(e).__name__}: {e}".splitlines()[0][:60]
+                        continue
+                    timings[name].append((run < args.warmup, elapsed))
+                    rss_growth.setdefault(name, (rss_bytes() - rss_before) / 2 ** 20)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    result = {"stages": {}, "total_seconds": 0.0, "peak_rss_mb": peak_rss_mb()}
+    for name, _ in stages:
+        warm = [t for cold, t in timings[name] if not cold]
+        if warm:
+            median = statistics.median(warm)
+            cold = timings[name][0][1]
+            result["stages"][name] = {"seconds": median, "cold_seconds": cold, "rss_growth_mb": rss_growth[name]}
+            result["total_seconds"] += median
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    regressions = []
+    rows = []
+    for name, _ in stages:
+        if name in skipped or name in failed:
+            rows.append([name, "-", "-", "-", "-", ("skipped: " + skipped[name]) if name in skipped
+                         else "FAILED: " + failed[name]])
+            continue
+        stage = result["stages"][name]
+        base = (baseline or {}).get("stages", {}).get(name)
+        status = ""
+        if base:
+            change = stage["seconds"] / base["seconds"] - 1 if base["seconds"] else 0.0
+            status = f"{change:+.0%}"
+            if change > args.tolerance and stage["seconds"] - base["seconds"] > args.min_delta:
+                status += " REGRESSION"
+                regressions.append(name)
+        rows.append([name, f"{stage['cold_seconds']:.3f}", f"{stage['seconds']:.3f}",
+                     f"{base['seconds']:.3f}" if base else "-", f"{stage['rss_growth_mb']:+.0f}", status])
+    print_table(["stage", "cold s", "warm s", "baseline s", "cold +RSS MiB", "vs baseline"], rows)
+
+    print(f"pipeline: {result['total_seconds']:.2f}s over {len(result['stages'])} stages, "
+          f"process peak RSS {result['peak_rss_mb']:.0f} MB")
+    if baseline:
+        base_rss = baseline.get("peak_rss_mb")
+        if base_rss and result["peak_rss_mb"] > base_rss * (1 + args.rss_tolerance):
+            print(f"peak RSS REGRESSION: {result['peak_rss_mb']:.0f} MB vs {base_rss:.0f} MB")
+            regressions.append("peak RSS")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+    if regressions or failed:
+        raise SystemExit(1)
+
+
+def bench_model_startup(args):
+    from model_registry import registry
+    import detect_fracture  # noqa: F401  (registers the fracture models)
+    import ocr  # noqa: F401  (registers paddleocr)
+    import stt  # noqa: F401  (registers silero_vad)
+    import transcribers  # noqa: F401  (registers the transcriber)
+
+    names = args.models or list(registry.stats())
+    start = time.perf_counter()
+    registry.warmup(names, background=False)
+    print(registry.report())
+    print(f"total: {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Doctor performance benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("fracture-batch", help="predict_fracture throughput by batch size")
+    p.add_argument("images", nargs="+", help="X-ray image files or directories")
+    p.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    p.add_argument("--count", type=int, default=64, help="images per batch size run")
+    p.add_argument("--clients", type=int, default=16, help="concurrent callers for the queue run")
+    p.add_argument("--max-wait-ms", type=float, default=10)
+    p.set_defaults(func=bench_fracture_batch)
+
+    p = sub.add_parser("fracture-parity", help="shared-backbone vs two-pass predictions and latency")
+    p.add_argument("images", nargs="+", help="X-ray image files or directories")
+    p.set_defaults(func=bench_fracture_parity)
+
+    p = sub.add_parser("fracture-backends", help="accuracy parity, latency and memory of exported models")
+    p.add_argument("images", nargs="+", help="X-ray fixture images or directories")
+    p.add_argument("--backend", choices=["tflite", "onnx"], default="tflite")
+    p.add_argument("--quantization", nargs="+", default=["float16", "dynamic", "int8"])
+    p.add_argument("--min-agreement", type=float, default=0.98)
+    p.set_defaults(func=bench_fracture_backends)
+
+    p = sub.add_parser("ocr-workers", help="test report OCR pages/second by worker count")
+    p.add_argument("reports", nargs="+", help="report images/PDFs or directories")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--pages", type=int, default=16, help="pages per run (inputs are repeated)")
+    p.set_defaults(func=bench_ocr_workers)
+
+    p = sub.add_parser("layout", help="test report layout reconstruction on synthetic reports")
+    p.add_argument("--boxes", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+    p.add_argument("--skew", type=float, default=0.0, help="dy/dx tilt of the synthetic page")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_layout)
+
+    p = sub.add_parser("llm-context", help="prompt tokens before and after the context builder")
+    p.add_argument("reports", nargs="*", help="PaddleOCR JSON outputs or directories (default: synthetic)")
+    p.add_argument("--budget", type=int, default=8000)
+    p.set_defaults(func=bench_llm_context)
+
+    p = sub.add_parser("stt-latency", help="end-of-speech to text latency, fixed vs streaming capture")
+    p.add_argument("wavs", nargs="+", help="16-bit WAV files or directories")
+    p.add_argument("--backend", default="whisper", choices=["whisper", "faster-whisper"])
+    p.add_argument("--model", default="base", help="model size or local checkpoint path")
+    p.add_argument("--timeout", type=float, default=10, help="fixed-mode recording length")
+    p.set_defaults(func=bench_stt_latency)
+
+    p = sub.add_parser("vad", help="per-call latency and allocations of voice extraction")
+    p.add_argument("wavs", nargs="+", help="16-bit WAV files or directories")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--pauses", type=int, nargs="+", default=[150, 250, 300, 400, 600],
+                   help="pauses in ms between two utterances checked for overlapping segments")
+    p.set_defaults(func=bench_vad)
+
+    p = sub.add_parser("stt-wer", help="real-time factor and WER of speech-to-text backends")
+    p.add_argument("fixtures", nargs="+", help="WAV files with same-named .txt transcripts, or directories")
+    p.add_argument("--candidates", nargs="+",
+                   default=["whisper:medium", "whisper:small", "whisper:base", "faster-whisper:small"],
+                   help="backend:model pairs; model may be a local checkpoint path")
+    p.set_defaults(func=bench_stt_wer)
+
+    p = sub.add_parser("tts-engines", help="time to first audio per text-to-speech engine")
+    p.add_argument("--engines", nargs="+", default=["gtts", "espeak", "piper"])
+    p.add_argument("--texts", nargs="*", help="utterances to synthesize (default: app prompts)")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_tts_engines)
+
+    p = sub.add_parser("llm-stream", help="time to first token and first question against a mock LLM server")
+    p.add_argument("--first-token-delay", type=float, default=1.0)
+    p.add_argument("--token-delay", type=float, default=0.03)
+    p.set_defaults(func=bench_llm_stream)
+
+    p = sub.add_parser("llm-load", help="concurrent sessions against a mock LLM server with injected failures")
+    p.add_argument("--sessions", type=int, default=50)
+    p.add_argument("--concurrency", type=int, default=8, help="pool in-flight limit")
+    p.add_argument("--retries", type=int, default=3)
+    p.add_argument("--timeout", type=float, default=30)
+    p.add_argument("--error-rate", type=float, default=0.1)
+    p.add_argument("--jitter", type=float, default=0.5)
+    p.add_argument("--first-token-delay", type=float, default=0.3)
+    p.add_argument("--token-delay", type=float, default=0.005)
+    p.set_defaults(func=bench_llm_load)
+
+    p = sub.add_parser("llm-cache", help="upstream calls and wall time with duplicate requests, by cache backend")
+    p.add_argument("--sessions", type=int, default=20)
+    p.add_argument("--distinct", type=int, default=5, help="distinct message histories among the sessions")
+    p.add_argument("--double-click", type=float, default=0.5, help="fraction of sessions sent twice at once")
+    p.add_argument("--backends", nargs="+", default=["memory", "disk"])
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--first-token-delay", type=float, default=1.0)
+    p.add_argument("--token-delay", type=float, default=0.005)
+    p.set_defaults(func=bench_llm_cache)
+
+    p = sub.add_parser("pdf-render", help="single-pass vs render-count-rerender prescription PDFs")
+    p.add_argument("--items", type=int, nargs="+", default=[1, 2, 3, 4, 5, 6, 8])
+    p.add_argument("--seeds", type=int, default=10, help="random prescriptions per size (layout parity)")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_pdf_render)
+
+    p = sub.add_parser("pdf-throughput", help="prescription PDFs per second with a cached vs per-call template")
+    p.add_argument("--count", type=int, default=60)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    p.set_defaults(func=bench_pdf_throughput)
+
+    p = sub.add_parser("prescription-parser", help="golden corpus, fuzzed parity and speed of extract_prescription_data")
+    p.add_argument("--fixtures", default="fixtures/prescriptions", help="LLM outputs (.txt) with expected .json")
+    p.add_argument("--fuzz", type=int, default=5000, help="malformed variants compared with the legacy parser")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 50, 500])
+    p.add_argument("--repeat", type=int, default=2000, help="parses per size, divided by the size")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_prescription_parser)
+
+    p = sub.add_parser("pipeline", help="per-stage and end-to-end consultation timing, offline, against a baseline")
+    p.add_argument("--stages", nargs="+", help="only these stages (names as printed)")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--warmup", type=int, default=1, help="runs excluded from the medians (model loads)")
+    p.add_argument("--ocr-json", default="fixtures/ocr/lab_report.json")
+    p.add_argument("--wavs", nargs="*", help="speech WAVs for speech_to_text (default: synthetic)")
+    p.add_argument("--tts-engine", default="silent")
+    p.add_argument("--first-token-delay", type=float, default=0.2)
+    p.add_argument("--token-delay", type=float, default=0.002)
+    p.add_argument("--baseline", default="fixtures/pipeline_baseline.json")
+    p.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    p.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown per stage")
+    p.add_argument("--min-delta", type=float, default=0.005, help="ignore slowdowns smaller than this (s)")
+    p.add_argument("--rss-tolerance", type=float, default=0.2)
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser("model-startup", help="per-model load time and memory")
+    p.add_argument("models", nargs="*", help="registry names (default: all)")
+    p.set_defaults(func=bench_model_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
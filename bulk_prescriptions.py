@@ -0,0 +1,203 @@
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pdf_builder import build_pdf, get_template
+
+
+def iter_records(source):
+    # (record id, JSON text) from a directory of .json files, a .jsonl file or "-" (JSONL on stdin)
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.endswith(".json"):
+                with open(os.path.join(source, name)) as f:
+                    yield os.path.splitext(name)[0], f.read()
+        return
+    stream = sys.stdin if source == "-" else open(source)
+    try:
+        for line_no, line in enumerate(stream, start=1):
+            if line.strip():
+                yield f"line{line_no}", line
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def init_worker():
+    # build this process's template before the first record arrives; per-record
+    # layout notes from build_pdf would only flood the console
+    sys.stdout = open(os.devnull, "w")
+    get_template()
+
+
+def render_record(record_id, text):
+    # runs in a worker process; a record may carry its own "id"
+    start = time.perf_counter()
+    try:
+        data = json.loads(text)
+        record_id = str(data.pop("id", record_id))
+        return record_id, build_pdf(data), None, time.perf_counter() - start
+    except Exception as e:
+        return record_id, None, f"{type(e).__name__}: {e}", time.perf_counter() - start
+
+
+class ZipSink:
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self.names = set()
+
+    def add(self, record_id, pdf):
+        name = re.sub(r"[^\w.-]+", "_", record_id) or "prescription"
+        unique, n = name, 1
+        while unique in self.names:
+            n += 1
+            unique = f"{name}_{n}"
+        self.names.add(unique)
+        self.zip.writestr(unique + ".pdf", pdf)
+
+    def close(self):
+        self.zip.close()
+
+
+class MergedPdfSink:
+    # Streams one merged PDF: each record's page objects are renumbered and
+    # written straight to the file, and only their offsets and page numbers are
+    # kept. The page tree, catalog and xref table are written on close.
+    # Objects 1 and 2 are reserved for the catalog and the page tree.
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.offsets = [None, None]
+        self.page_ids = []
+
+    def add(self, record_id, pdf):
+        from PyPDF2 import PdfReader
+        from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+        reader = PdfReader(io.BytesIO(pdf))
+        new_ids = {}
+        queue = []
+
+        def ref(obj):
+            key = (obj.idnum, obj.generation)
+            if key not in new_ids:
+                self.offsets.append(None)
+                new_ids[key] = len(self.offsets)
+                queue.append(obj)
+            return IndirectObject(new_ids[key], 0, None)
+
+        def renumber(obj):
+            # rewrites references in place; the reader is dropped afterwards
+            if isinstance(obj, IndirectObject):
+                return ref(obj)
+            if isinstance(obj, DictionaryObject):
+                for key, value in list(obj.items()):
+                    obj[key] = renumber(value)
+            elif isinstance(obj, ArrayObject):
+                for i, value in enumerate(obj):
+                    obj[i] = renumber(value)
+            return obj
+
+        for page in reader.pages:
+            self.page_ids.append(ref(page.indirect_reference).idnum)
+        while queue:
+            source = queue.pop(0)
+            obj = source.get_object()
+            is_page = isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page"
+            if is_page:
+                # don't follow the page back up into the source's page tree
+                obj.pop("/Parent", None)
+            renumber(obj)
+            if is_page:
+                obj[NameObject("/Parent")] = IndirectObject(2, 0, None)
+            self._write(new_ids[(source.idnum, source.generation)], obj)
+
+    def _write(self, number, obj):
+        self.offsets[number - 1] = self.file.tell()
+        self.file.write(f"{number} 0 obj\n".encode("ascii"))
+        if isinstance(obj, bytes):
+            self.file.write(obj)
+        else:
+            obj.write_to_stream(self.file, None)
+        self.file.write(b"\nendobj\n")
+
+    def close(self):
+        kids = " ".join(f"{n} 0 R" for n in self.page_ids)
+        self._write(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode("ascii"))
+        self._write(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.file.tell()
+        self.file.write(f"xref\n0 {len(self.offsets) + 1}\n0000000000 65535 f \n".encode("ascii"))
+        for offset in self.offsets:
+            self.file.write(f"{offset:010d} 00000 n \n".encode("ascii"))
+        self.file.write(f"trailer\n<< /Size {len(self.offsets) + 1} /Root 1 0 R >>\n"
+                        f"startxref\n{xref}\n%%EOF\n".encode("ascii"))
+        self.file.close()
+
+
+def run(source, output, workers=None, window=None):
+    # Renders in a process pool and writes results in input order. At most
+    # `window` records are in flight, so memory stays flat for any input size.
+    workers = workers or os.cpu_count() or 1
+    window = window or 4 * workers
+    sink = MergedPdfSink(output) if output.lower().endswith(".pdf") else ZipSink(output)
+    done, failures, render_seconds = 0, [], 0.0
+    start = time.perf_counter()
+
+    def collect(future):
+        nonlocal done, render_seconds
+        record_id, pdf, error, seconds = future.result()
+        render_seconds += seconds
+        if error is None:
+            sink.add(record_id, pdf)
+            done += 1
+        else:
+            failures.append((record_id, error))
+            print(f"{record_id}: failed - {error}", file=sys.stderr)
+
+    try:
+        with ProcessPoolExecutor(workers, initializer=init_worker) as pool:
+            pending = deque()
+            for record_id, text in iter_records(source):
+                pending.append(pool.submit(render_record, record_id, text))
+                if len(pending) >= window:
+                    collect(pending.popleft())
+            while pending:
+                collect(pending.popleft())
+    finally:
+        sink.close()
+
+    elapsed = time.perf_counter() - start
+    total = done + len(failures)
+    print(f"{done}/{total} prescriptions -> {output} in {elapsed:.1f}s "
+          f"({done / elapsed if elapsed else 0:.1f}/s, {workers} workers, "
+          f"{1000 * render_seconds / total if total else 0:.0f} ms render each)")
+    return done, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render prescription PDFs in bulk")
+    parser.add_argument("source", help="directory of .json records, a .jsonl file, or - for JSONL on stdin")
+    parser.add_argument("-o", "--output", required=True, help="output .zip (one PDF per record) or merged .pdf")
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument("--window", type=int, default=None, help="records in flight (default: 4 per worker)")
+    parser.add_argument("--failures", help="write failed records as JSONL {id, error} to this file")
+    args = parser.parse_args()
+
+    _, failures = run(args.source, args.output, args.workers, args.window)
+    if args.failures:
+        with open(args.failures, "w") as f:
+            for record_id, error in failures:
+                f.write(json.dumps({"id": record_id, "error": error}) + "\n")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
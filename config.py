@@ -0,0 +1,98 @@
+import os
+
+
+def env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_list(name, default):
+    value = os.environ.get(name, default)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# Fracture detection
+FRACTURE_MODEL_DIR = os.environ.get("FRACTURE_MODEL_DIR", "fracture_models")
+FRACTURE_MAX_BATCH = int(os.environ.get("FRACTURE_MAX_BATCH", 16))
+FRACTURE_MAX_WAIT_MS = float(os.environ.get("FRACTURE_MAX_WAIT_MS", 10))
+FRACTURE_SHARED_BACKBONE = env_flag("FRACTURE_SHARED_BACKBONE", True)
+# "keras" runs the original .h5 models; "tflite" / "onnx" run exports made by
+# export_fracture_models.py with the given quantization (float32, float16, int8)
+FRACTURE_BACKEND = os.environ.get("FRACTURE_BACKEND", "keras")
+FRACTURE_QUANTIZATION = os.environ.get("FRACTURE_QUANTIZATION", "int8")
+FRACTURE_EXPORT_DIR = os.environ.get("FRACTURE_EXPORT_DIR", "fracture_models/export")
+FRACTURE_NUM_THREADS = int(os.environ.get("FRACTURE_NUM_THREADS", 0)) or None
+# TFLite batches are padded up to one of these sizes, each with its own
+# interpreter, so micro-batches of varying size never reallocate tensors
+FRACTURE_TFLITE_BATCH_SIZES = sorted(int(n) for n in env_list("FRACTURE_TFLITE_BATCH_SIZES", "1,4,8,16"))
+
+# Cache of fracture predictions keyed by image bytes and model version
+XRAY_CACHE_ENABLED = env_flag("XRAY_CACHE_ENABLED", True)
+XRAY_CACHE_DIR = os.environ.get("XRAY_CACHE_DIR", ".cache/fracture")
+XRAY_CACHE_MAX_MB = float(os.environ.get("XRAY_CACHE_MAX_MB", 64))
+XRAY_CACHE_TTL_SECONDS = float(os.environ.get("XRAY_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+
+# OCR: set to a directory to also write PaddleOCR's visualisation image and JSON
+OCR_DEBUG_DIR = os.environ.get("OCR_DEBUG_DIR") or None
+# warm PaddleOCR instances for multi-page reports, and the PDF render resolution
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", 2))
+OCR_PDF_DPI = int(os.environ.get("OCR_PDF_DPI", 200))
+
+# Speech-to-text
+# STT_BACKEND is "whisper" (openai-whisper) or "faster-whisper" (CTranslate2);
+# STT_MODEL is a model size or a local checkpoint path
+STT_BACKEND = os.environ.get("STT_BACKEND", "whisper")
+STT_MODEL = os.environ.get("STT_MODEL") or os.environ.get("WHISPER_MODEL", "medium")
+STT_COMPUTE_TYPE = os.environ.get("STT_COMPUTE_TYPE", "int8")
+# Streaming capture stops after this much trailing silence, when no speech
+# starts within STT_NO_SPEECH_TIMEOUT, or at STT_MAX_DURATION seconds.
+# STT_STREAMING=0 restores the fixed 10 second recording.
+STT_STREAMING = env_flag("STT_STREAMING", True)
+STT_TRAILING_SILENCE_MS = float(os.environ.get("STT_TRAILING_SILENCE_MS", 800))
+STT_NO_SPEECH_TIMEOUT = float(os.environ.get("STT_NO_SPEECH_TIMEOUT", 8))
+STT_MAX_DURATION = float(os.environ.get("STT_MAX_DURATION", 30))
+STT_VAD_THRESHOLD = float(os.environ.get("STT_VAD_THRESHOLD", 0.5))
+
+# Text-to-speech: TTS_ENGINE is "gtts" (online), "espeak" or "piper" (offline),
+# or "silent" (no audio, for benchmarks)
+TTS_ENGINE = os.environ.get("TTS_ENGINE", "gtts")
+ESPEAK_VOICE = os.environ.get("ESPEAK_VOICE", "en-us")
+ESPEAK_SPEED = int(os.environ.get("ESPEAK_SPEED", 160))
+PIPER_MODEL = os.environ.get("PIPER_MODEL", "")
+PIPER_BINARY = os.environ.get("PIPER_BINARY", "piper")
+
+# Text-to-speech audio cache, keyed by engine, language and text
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", ".cache/tts")
+TTS_CACHE_MAX_MB = float(os.environ.get("TTS_CACHE_MAX_MB", 200))
+
+# LLM client: OpenAI-compatible endpoint, in-flight request limit per process,
+# per-call deadline in seconds (queueing included), the overall deadline for a
+# streamed response and retries on 429/5xx/timeouts
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_API_KEY = os.environ.get("LLM_API_KEY") or os.environ.get("OPENROUTER_API_KEY")
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 180))
+LLM_STREAM_TIMEOUT = float(os.environ.get("LLM_STREAM_TIMEOUT", 600))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF = float(os.environ.get("LLM_BACKOFF", 1.0))
+# prompt token budget per request; test reports are cut to fit, and by default
+# only their rows with results and reference ranges are sent
+LLM_CONTEXT_BUDGET = int(os.environ.get("LLM_CONTEXT_BUDGET", 8000))
+LLM_REPORT_RELEVANT_ONLY = env_flag("LLM_REPORT_RELEVANT_ONLY", True)
+# Opt-in cache of LLM responses keyed by model, parameters and messages;
+# LLM_CACHE_BACKEND is "memory" (per process) or "disk" (shared, in LLM_CACHE_DIR)
+LLM_CACHE_ENABLED = env_flag("LLM_CACHE_ENABLED", False)
+LLM_CACHE_BACKEND = os.environ.get("LLM_CACHE_BACKEND", "memory")
+LLM_CACHE_DIR = os.environ.get("LLM_CACHE_DIR", ".cache/llm")
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 256))
+LLM_CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", 3600))
+
+# Per-session artifacts stay in memory up to this size (MB) each, then go to a temp dir
+ARTIFACT_SPILL_MB = float(os.environ.get("ARTIFACT_SPILL_MB", 8))
+
+# Model registry: models loaded in a background thread at startup, and how long
+# a model may sit unused before it is unloaded (0 keeps everything resident)
+WARMUP_MODELS = env_list("WARMUP_MODELS", "transcriber")
+MODEL_IDLE_UNLOAD_SECONDS = float(os.environ.get("MODEL_IDLE_UNLOAD_SECONDS", 0))
@@ -0,0 +1,110 @@
+import functools
+import math
+import re
+import textwrap
+
+import config
+
+REPORT_HEADER = ("This is the OCR output of the uploaded medical test report. Please consider this "
+                 "information while generating the prescription. The OCR output is as follows:\n\n")
+
+# a reference range ("13.0 - 17.0", "4 to 11", "< 200") or an abnormal/qualitative flag
+RANGE_RE = re.compile(r"\b\d{1,5}(?:\.\d+)?\s*(?:-|–|to)\s*\d{1,5}(?:\.\d+)?\b|[<>≤≥]\s*\d")
+FLAG_RE = re.compile(r"\b(?:H|L|HIGH|LOW|High|Low|Abnormal|Positive|Negative|Reactive|Non-Reactive|Detected|Not Detected)\b")
+# a test name followed by a numeric result
+VALUE_RE = re.compile(r"[A-Za-z][A-Za-z0-9 ()/%.,-]*?\s[<>]?\d+(?:\.\d+)?")
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # tiktoken is optional; ~4 characters per token is close enough for budgeting
+        return None
+
+
+def count_tokens(text):
+    encoding = _encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages):
+    # a few tokens of framing per message, as in OpenAI's chat format
+    return sum(count_tokens(m["content"]) + 4 for m in messages)
+
+
+def squeeze(text):
+    # drop shared indentation, trailing spaces and runs of blank lines
+    lines = [line.rstrip() for line in textwrap.dedent(text).strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def is_lab_row(line):
+    return bool(RANGE_RE.search(line) or FLAG_RE.search(line)) and bool(VALUE_RE.search(line))
+
+
+def compact_report(text, relevant_only=True):
+    # The layout engine pads columns with spaces; one space keeps rows readable.
+    # With relevant_only, keep rows that carry a result with a range or flag and
+    # the heading line above each group of them. Falls back to every row when
+    # nothing looks like a lab table (e.g. a narrative radiology report).
+    lines = [re.sub(r"\s{2,}", " ", line).strip() for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    if not relevant_only:
+        return "\n".join(lines)
+
+    kept = []
+    heading = None
+    for line in lines:
+        if is_lab_row(line):
+            if heading is not None:
+                kept.append(heading)
+                heading = None
+            kept.append(line)
+        elif not any(ch.isdigit() for ch in line) and len(line) <= 60:
+            heading = line
+    return "\n".join(kept) if kept else "\n".join(lines)
+
+
+def report_message(ocr_text, relevant_only=None):
+    if relevant_only is None:
+        relevant_only = config.LLM_REPORT_RELEVANT_ONLY
+    return {"role": "user", "content": REPORT_HEADER + compact_report(ocr_text, relevant_only)}
+
+
+def _truncate(content, max_tokens):
+    # drop report rows from the end until the message fits
+    lines = content.splitlines()
+    dropped = 0
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        step = max(1, len(lines) // 10)
+        lines = lines[:-step]
+        dropped += step
+    return "\n".join(lines) + f"\n[{dropped} more report rows omitted]"
+
+
+def build_context(messages, budget=None):
+    # Copy of `messages` within `budget` prompt tokens. Every message is
+    # squeezed; if that is not enough, test report rows are cut, since system
+    # prompts, the patient's answers and the final instruction must go as is.
+    budget = budget or config.LLM_CONTEXT_BUDGET
+    before = count_message_tokens(messages)
+    fitted = [dict(m, content=squeeze(m["content"])) for m in messages]
+
+    over = count_message_tokens(fitted) - budget
+    for m in fitted:
+        if over <= 0:
+            break
+        if m["content"].startswith(REPORT_HEADER.strip()):
+            size = count_tokens(m["content"])
+            m["content"] = _truncate(m["content"], max(size - over, 0))
+            over -= size - count_tokens(m["content"])
+
+    after = count_message_tokens(fitted)
+    print(f"LLM context: {after} tokens (was {before}, saved {before - after}, budget {budget})"
+          + (" - over budget" if after > budget else ""))
+    return fitted
@@ -1,40 +1,389 @@
 import numpy as np
 import tensorflow as tf
 from keras.preprocessing import image
+import io
 import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
 
-model_elbow_frac = tf.keras.models.load_model("fracture_models/ResNet50_Elbow_frac_best.h5")
-model_hand_frac = tf.keras.models.load_model("fracture_models/ResNet50_Hand_frac_best.h5")
-model_shoulder_frac = tf.keras.models.load_model("fracture_models/ResNet50_Shoulder_frac_best.h5")
-model_parts = tf.keras.models.load_model("fracture_models/ResNet50_BodyParts.h5")
+import config
+from disk_cache import DiskCache
+from model_registry import registry
+
+
+# registry name -> file stem under FRACTURE_MODEL_DIR (Keras) / FRACTURE_EXPORT_DIR (exports)
+model_files = {
+    "fracture_elbow": "ResNet50_Elbow_frac_best",
+    "fracture_hand": "ResNet50_Hand_frac_best",
+    "fracture_shoulder": "ResNet50_Shoulder_frac_best",
+    "fracture_parts": "ResNet50_BodyParts",
+}
+
+
+def export_path(name, backend, quantization):
+    ext = {"tflite": "tflite", "onnx": "onnx"}[backend]
+    return os.path.join(config.FRACTURE_EXPORT_DIR, f"{model_files[name]}.{quantization}.{ext}")
+
+
+# TFLite interpreters exposing the same predict() as a Keras model. Batches
+# are zero-padded up to the next of `batch_sizes` and run on an interpreter
+# allocated once for that size; larger batches are split. All interpreters
+# share one copy of the model file.
+class TFLiteModel:
+    def __init__(self, path, num_threads=None, batch_sizes=None):
+        with open(path, "rb") as f:
+            self.content = f.read()
+        self.num_threads = num_threads
+        self.batch_sizes = sorted(batch_sizes or config.FRACTURE_TFLITE_BATCH_SIZES)
+        self._interpreters = {}
+        self._lock = threading.Lock()
+
+    def _interpreter(self, batch_size, shape):
+        # (interpreter, input details, output details, lock) for one batch size
+        with self._lock:
+            if batch_size not in self._interpreters:
+                interpreter = tf.lite.Interpreter(model_content=self.content, num_threads=self.num_threads)
+                index = interpreter.get_input_details()[0]["index"]
+                interpreter.resize_tensor_input(index, [batch_size, *shape])
+                interpreter.allocate_tensors()
+                self._interpreters[batch_size] = (interpreter, interpreter.get_input_details()[0],
+                                                  interpreter.get_output_details()[0], threading.Lock())
+            return self._interpreters[batch_size]
+
+    def predict(self, images, verbose=0):
+        largest = self.batch_sizes[-1]
+        if len(images) > largest:
+            return np.concatenate([self.predict(images[i:i + largest]) for i in range(0, len(images), largest)])
+
+        batch_size = next(size for size in self.batch_sizes if size >= len(images))
+        interpreter, input_details, output_details, lock = self._interpreter(batch_size, images.shape[1:])
+        x = images
+        if batch_size > len(images):
+            x = np.concatenate([x, np.zeros((batch_size - len(images), *images.shape[1:]), images.dtype)])
+        scale, zero_point = input_details["quantization"]
+        if scale:
+            limits = np.iinfo(input_details["dtype"])
+            x = np.clip(np.round(x / scale + zero_point), limits.min, limits.max)
+        with lock:
+            interpreter.set_tensor(input_details["index"], x.astype(input_details["dtype"]))
+            interpreter.invoke()
+            y = interpreter.get_tensor(output_details["index"])[:len(images)]
+
+        scale, zero_point = output_details["quantization"]
+        if scale:
+            y = (y.astype(np.float32) - zero_point) * scale
+        return y
+
+
+# ONNX Runtime session exposing the same predict() as a Keras model.
+class OnnxModel:
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, images, verbose=0):
+        return self.session.run(None, {self.input_name: images.astype(np.float32)})[0]
+
+
+def load_model(name, backend=None, quantization=None):
+    backend = backend or config.FRACTURE_BACKEND
+    quantization = quantization or config.FRACTURE_QUANTIZATION
+    if backend == "keras":
+        return tf.keras.models.load_model(os.path.join(config.FRACTURE_MODEL_DIR, model_files[name] + ".h5"))
+    if backend == "tflite":
+        return TFLiteModel(export_path(name, backend, quantization), config.FRACTURE_NUM_THREADS)
+    if backend == "onnx":
+        return OnnxModel(export_path(name, backend, quantization), config.FRACTURE_NUM_THREADS)
+    raise ValueError(f"Unknown fracture backend: {backend}")
+
+
+for _name in model_files:
+    registry.register(_name, lambda name=_name: load_model(name))
 
 categories_parts = ["elbow", "wrist", "shoulder"]
 categories_fracture = ["fractured", "normal"]
 
-def predict_fracture(image_path):
-    size = 224
-    temp_img = image.load_img(image_path, target_size=(size, size))
-    x = image.img_to_array(temp_img)
-    x = np.expand_dims(x, axis=0)
-    images = np.vstack([x])
-
-    part_idx = np.argmax(model_parts.predict(images), axis=1).item()
-    body_part = categories_parts[part_idx]
-
-    if body_part == "wrist":
-        part_model = model_hand_frac
-        model_name = "Hand"
-    elif body_part == "elbow":
-        part_model = model_elbow_frac
-        model_name = "Elbow"
-    elif body_part == "shoulder":
-        part_model = model_shoulder_frac
-        model_name = "Shoulder"
-
-    frac_idx = np.argmax(part_model.predict(images), axis=1).item()
-    fracture_status = categories_fracture[frac_idx]
+# body part -> (registry name of the fracture model, display name)
+part_models = {
+    "wrist": ("fracture_hand", "Hand"),
+    "elbow": ("fracture_elbow", "Elbow"),
+    "shoulder": ("fracture_shoulder", "Shoulder"),
+}
 
+IMAGE_SIZE = 224
+
+# Stage boundaries of Keras' ResNet50 where the graph narrows to a single tensor,
+# so a model can be cut there into a prefix and a suffix.
+RESNET_STAGES = ["conv2_block3_out", "conv3_block4_out", "conv4_block6_out", "conv5_block3_out"]
+
+
+# image_path may also be a file-like object (e.g. io.BytesIO of an upload)
+def load_image_array(image_path):
+    temp_img = image.load_img(image_path, target_size=(IMAGE_SIZE, IMAGE_SIZE))
+    return image.img_to_array(temp_img)
+
+
+def format_result(model_name, fracture_status):
     if fracture_status == "fractured":
         return f"Fracture detected on {model_name}"
     else:
-        return f"No fracture detected on {model_name}"
\ No newline at end of file
+        return f"No fracture detected on {model_name}"
+
+
+def backbone_of(model):
+    nested = [layer for layer in model.layers if isinstance(layer, tf.keras.Model)]
+    return nested[0] if nested else model
+
+
+def shared_stage(model_a, model_b):
+    # deepest ResNet stage up to which both backbones carry identical weights
+    layers_b = {layer.name: layer for layer in backbone_of(model_b).layers}
+    shared = None
+    for layer in backbone_of(model_a).layers:
+        other = layers_b.get(layer.name)
+        if other is None:
+            break
+        weights_a, weights_b = layer.get_weights(), other.get_weights()
+        if len(weights_a) != len(weights_b) or not all(
+                np.array_equal(a, b) for a, b in zip(weights_a, weights_b)):
+            break
+        if layer.name in RESNET_STAGES:
+            shared = layer.name
+    return shared
+
+
+def split_model(model, stage):
+    # returns (prefix: image -> stage features, suffix: stage features -> class scores)
+    backbone = backbone_of(model)
+    cut = backbone.get_layer(stage).output
+    if backbone is model:
+        return tf.keras.Model(model.input, cut), tf.keras.Model(cut, model.output)
+
+    idx = model.layers.index(backbone)
+    if any(not isinstance(layer, tf.keras.layers.InputLayer) for layer in model.layers[:idx]):
+        raise ValueError(f"{model.name}: layers before the backbone are not supported")
+
+    inp = tf.keras.Input(shape=cut.shape[1:])
+    x = inp if cut is backbone.output else tf.keras.Model(cut, backbone.output)(inp)
+    for layer in model.layers[idx + 1:]:
+        x = layer(x)
+    return tf.keras.Model(backbone.input, cut), tf.keras.Model(inp, x)
+
+
+# Runs the body-part model's backbone once and hands its stage features to the
+# fracture models' heads, for as much of the backbone as they share.
+class SharedBackboneClassifier:
+    def __init__(self, parts_model, fracture_models):
+        self.stages = {part: shared_stage(parts_model, model) for part, model in fracture_models.items()}
+        needed = [s for s in RESNET_STAGES if s in self.stages.values() or s == RESNET_STAGES[-1]]
+
+        backbone = backbone_of(parts_model)
+        self.features = tf.keras.Model(backbone.input, [backbone.get_layer(s).output for s in needed])
+        self.needed = needed
+        self.parts_head = split_model(parts_model, RESNET_STAGES[-1])[1]
+        self.suffixes = {}
+        for part, stage in self.stages.items():
+            model = fracture_models[part]
+            self.suffixes[part] = split_model(model, stage)[1] if stage else model
+
+    def predict(self, images):
+        feats = self.features.predict(images, verbose=0)
+        if len(self.needed) == 1:
+            feats = [feats]
+        feats = dict(zip(self.needed, feats))
+        part_scores = self.parts_head.predict(feats[RESNET_STAGES[-1]], verbose=0)
+        return part_scores, feats
+
+    def predict_fracture(self, body_part, images, feats, rows):
+        stage = self.stages[body_part]
+        x = feats[stage][rows] if stage else images[rows]
+        return self.suffixes[body_part].predict(x, verbose=0)
+
+
+def _load_shared_classifier():
+    # None when the models can't be split (e.g. not a Keras ResNet50 layout)
+    try:
+        shared = SharedBackboneClassifier(
+            registry.get("fracture_parts"),
+            {part: registry.get(name) for part, (name, _) in part_models.items()})
+    except (ValueError, KeyError) as e:
+        print(f"Shared backbone disabled: {e}")
+        return None
+    print(f"Shared backbone stages: {shared.stages}")
+    return shared
+
+
+registry.register("fracture_shared", _load_shared_classifier,
+                  depends_on=["fracture_parts"] + [name for name, _ in part_models.values()])
+
+
+def get_shared_classifier():
+    return registry.get("fracture_shared")
+
+
+def classify_batch(images, shared=None):
+    if shared is None:
+        shared = config.FRACTURE_SHARED_BACKBONE
+    # the multi-head split needs the original Keras graphs
+    shared = shared and config.FRACTURE_BACKEND == "keras"
+    multi_head = get_shared_classifier() if shared else None
+
+    if multi_head:
+        part_scores, feats = multi_head.predict(images)
+    else:
+        part_scores = registry.get("fracture_parts").predict(images, verbose=0)
+    part_idx = np.argmax(part_scores, axis=1)
+
+    # one forward pass per body-part model, over every image of that part
+    results = [None] * len(images)
+    for part_i, body_part in enumerate(categories_parts):
+        rows = np.flatnonzero(part_idx == part_i)
+        if rows.size == 0:
+            continue
+        registry_name, model_name = part_models[body_part]
+        if multi_head:
+            frac_scores = multi_head.predict_fracture(body_part, images, feats, rows)
+        else:
+            frac_scores = registry.get(registry_name).predict(images[rows], verbose=0)
+        frac_idx = np.argmax(frac_scores, axis=1)
+        for row, idx in zip(rows, frac_idx):
+            results[row] = format_result(model_name, categories_fracture[idx])
+
+    return results
+
+
+def predict_fracture_batch(image_paths):
+    if not image_paths:
+        return []
+    return classify_batch(np.stack([load_image_array(p) for p in image_paths]))
+
+
+def predict_fracture(image_path):
+    return predict_fracture_batch([image_path])[0]
+
+
+_cache = None
+_model_version = None
+
+
+def get_prediction_cache():
+    global _cache
+    if _cache is None:
+        _cache = DiskCache(
+            config.XRAY_CACHE_DIR,
+            max_bytes=config.XRAY_CACHE_MAX_MB * 2 ** 20,
+            ttl_seconds=config.XRAY_CACHE_TTL_SECONDS,
+            suffix=".txt",
+        )
+    return _cache
+
+
+def model_version():
+    # changes whenever the backend, its settings or any model file changes
+    global _model_version
+    if _model_version is None:
+        parts = [config.FRACTURE_BACKEND, config.FRACTURE_QUANTIZATION, str(config.FRACTURE_SHARED_BACKBONE)]
+        for name in model_files:
+            if config.FRACTURE_BACKEND == "keras":
+                path = os.path.join(config.FRACTURE_MODEL_DIR, model_files[name] + ".h5")
+            else:
+                path = export_path(name, config.FRACTURE_BACKEND, config.FRACTURE_QUANTIZATION)
+            try:
+                st = os.stat(path)
+                parts.append(f"{path}:{st.st_size}:{st.st_mtime_ns}")
+            except FileNotFoundError:
+                parts.append(f"{path}:missing")
+        _model_version = DiskCache.key(*parts)
+    return _model_version
+
+
+def predict_fracture_bytes(data):
+    # uploads from concurrent sessions are micro-batched by the shared batcher
+    if not config.XRAY_CACHE_ENABLED:
+        return get_batcher().predict(io.BytesIO(data))
+
+    cache = get_prediction_cache()
+    key = DiskCache.key(model_version(), data)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached.decode("utf-8")
+
+    result = get_batcher().predict(io.BytesIO(data))
+    cache.put(key, result.encode("utf-8"))
+    return result
+
+
+# Holds concurrent requests for up to max_wait_ms and runs them through the models as one batch.
+class FractureBatcher:
+    def __init__(self, max_batch_size=16, max_wait_ms=10):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, image_path):
+        future = Future()
+        self._queue.put((image_path, future))
+        return future
+
+    def predict(self, image_path, timeout=None):
+        return self.submit(image_path).result(timeout=timeout)
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(pending) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            # decode per request so one unreadable upload doesn't fail the whole batch
+            ready = []
+            for path, fut in pending:
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                try:
+                    ready.append((load_image_array(path), fut))
+                except Exception as e:
+                    fut.set_exception(e)
+            if not ready:
+                continue
+            try:
+                results = classify_batch(np.stack([arr for arr, _ in ready]))
+            except Exception as e:
+                for _, fut in ready:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), result in zip(ready, results):
+                fut.set_result(result)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = FractureBatcher(
+                max_batch_size=config.FRACTURE_MAX_BATCH,
+                max_wait_ms=config.FRACTURE_MAX_WAIT_MS,
+            )
+        return _batcher
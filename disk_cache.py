@@ -0,0 +1,168 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+
+# Content-addressed file cache. Entries expire `ttl_seconds` after being written;
+# beyond `max_bytes` / `max_entries` the least recently read entries are evicted.
+# Last-read time is kept in each file's atime so several processes can share a directory.
+# Puts keep a running size total; the directory is only walked on the first put,
+# when the total goes over a cap (then evicting down to `low_water` of it), or
+# every `scan_interval` seconds, which also picks up other processes' writes.
+class DiskCache:
+    def __init__(self, directory, max_bytes=None, max_entries=None, ttl_seconds=None, suffix="",
+                 low_water=0.9, scan_interval=3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.suffix = suffix
+        self.low_water = low_water
+        self.scan_interval = min(scan_interval, ttl_seconds) if ttl_seconds else scan_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = None   # running totals; None until the first scan
+        self._count = None
+        self._next_scan = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        h = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode("utf-8")
+            h.update(len(part).to_bytes(8, "little"))
+            h.update(part)
+        return h.hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def _expired(self, st, now):
+        return self.ttl_seconds is not None and now - st.st_mtime > self.ttl_seconds
+
+    def get_path(self, key):
+        path = self.path_for(key)
+        now = time.time()
+        try:
+            st = os.stat(path)
+            if self._expired(st, now):
+                os.remove(path)
+                self._account(-st.st_size, -1)
+                raise FileNotFoundError(path)
+            os.utime(path, (now, st.st_mtime))
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def get(self, key):
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # evicted by another process between stat and open
+            return None
+
+    def put(self, key, data):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced = None
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._account(len(data) - (replaced or 0), replaced is None)
+        if self._needs_scan():
+            self.evict()
+        return path
+
+    def _account(self, size, count):
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += size
+                self._count += count
+
+    def _needs_scan(self):
+        if self.max_bytes is None and self.max_entries is None and self.ttl_seconds is None:
+            return False
+        with self._lock:
+            if self._bytes is None or time.time() >= self._next_scan:
+                return True
+            return ((self.max_bytes is not None and self._bytes > self.max_bytes)
+                    or (self.max_entries is not None and self._count > self.max_entries))
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+    def evict(self):
+        now = time.time()
+        live = []
+        removed = 0
+        for path, st in self._entries():
+            if self._expired(st, now):
+                removed += self._remove(path)
+            else:
+                live.append((st.st_atime, st.st_size, path))
+
+        live.sort()
+        total = sum(size for _, size, _ in live)
+        count = len(live)
+        over_bytes = self.max_bytes is not None and total > self.max_bytes
+        over_count = self.max_entries is not None and count > self.max_entries
+        if over_bytes or over_count:
+            # evict below the caps, so the next few puts don't trigger another scan
+            max_bytes = self.max_bytes * self.low_water if self.max_bytes is not None else None
+            max_entries = max(1, int(self.max_entries * self.low_water)) if self.max_entries is not None else None
+            for _, size, path in live:
+                if not ((max_bytes is not None and total > max_bytes)
+                        or (max_entries is not None and count > max_entries)):
+                    break
+                removed += self._remove(path)
+                total -= size
+                count -= 1
+
+        with self._lock:
+            self.evictions += removed
+            self._bytes, self._count = total, count
+            self._next_scan = now + self.scan_interval
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            return 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
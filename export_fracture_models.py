@@ -0,0 +1,95 @@
+import argparse
+import os
+
+import numpy as np
+import tensorflow as tf
+
+import config
+from detect_fracture import model_files, export_path, load_image_array, IMAGE_SIZE
+
+QUANTIZATIONS = ["float32", "float16", "dynamic", "int8"]
+
+
+def calibration_batches(image_paths, limit=100):
+    for path in image_paths[:limit]:
+        yield np.expand_dims(load_image_array(path), axis=0).astype(np.float32)
+
+
+def export_tflite(model, output_path, quantization, calibration_images):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "dynamic":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantization == "int8":
+        if not calibration_images:
+            raise SystemExit("int8 export needs --calibration images")
+        # integer kernels inside, float input/output so predict() callers are unchanged
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([x] for x in calibration_batches(calibration_images))
+
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+
+
+def export_onnx(model, output_path, quantization, calibration_images):
+    import onnx
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None, IMAGE_SIZE, IMAGE_SIZE, 3), tf.float32, name="input"),)
+    onnx_model, _ = tf2onnx.convert.from_keras(model, input_signature=spec, opset=13)
+
+    if quantization == "float32":
+        onnx.save(onnx_model, output_path)
+    elif quantization == "float16":
+        from onnxconverter_common import float16
+        onnx.save(float16.convert_float_to_float16(onnx_model, keep_io_types=True), output_path)
+    else:
+        from onnxruntime import quantization as ortq
+
+        fp32_path = output_path + ".fp32.tmp"
+        onnx.save(onnx_model, fp32_path)
+        try:
+            if quantization == "int8":
+                if not calibration_images:
+                    raise SystemExit("int8 export needs --calibration images")
+
+                class Reader(ortq.CalibrationDataReader):
+                    def __init__(self):
+                        self.batches = calibration_batches(calibration_images)
+
+                    def get_next(self):
+                        batch = next(self.batches, None)
+                        return None if batch is None else {"input": batch}
+
+                ortq.quantize_static(fp32_path, output_path, Reader(),
+                                     weight_type=ortq.QuantType.QInt8,
+                                     activation_type=ortq.QuantType.QUInt8)
+            else:
+                ortq.quantize_dynamic(fp32_path, output_path, weight_type=ortq.QuantType.QInt8)
+        finally:
+            os.remove(fp32_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the fracture classifiers for CPU inference")
+    parser.add_argument("--backend", choices=["tflite", "onnx"], default="tflite")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, nargs="+", default=["int8"])
+    parser.add_argument("--models", nargs="+", choices=list(model_files), default=list(model_files))
+    parser.add_argument("--calibration", nargs="*", default=[],
+                        help="X-ray images used to calibrate int8 activation ranges")
+    args = parser.parse_args()
+
+    exporters = {"tflite": export_tflite, "onnx": export_onnx}
+    os.makedirs(config.FRACTURE_EXPORT_DIR, exist_ok=True)
+    for name in args.models:
+        model = tf.keras.models.load_model(os.path.join(config.FRACTURE_MODEL_DIR, model_files[name] + ".h5"))
+        for quantization in args.quantization:
+            output_path = export_path(name, args.backend, quantization)
+            exporters[args.backend](model, output_path, quantization, args.calibration)
+            print(f"{name} -> {output_path} ({os.path.getsize(output_path) / 2 ** 20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
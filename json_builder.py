@@ -1,129 +1,154 @@
 import re
 import json
-from typing import List, Dict
-
-def extract_prescription_data(text: str) -> Dict:
-    def extract_field(pattern, source=None, default=""):
-        src = source if source else text
-        match = re.search(pattern, src, re.IGNORECASE | re.DOTALL)
-        return match.group(1).strip() if match else default
-
-    def extract_medications(section: str) -> List[Dict]:
-        if not section or "Not applicable" in section or "No medication prescribed" in section:
-            return []
-
-        meds = []
-        med_blocks = re.split(r"(?:\n|^)\s*(?:\d+[\.\)]|\-|\*)\s*(?=\*\*Name\*\*:)", section.strip())
-
-        for block in med_blocks:
-            block = block.strip()
-            if not block:
-                continue
-
-            if not block.startswith("**Name**:"):
-                block = "**Name**: " + block
-
-            raw_name = extract_field(r"\*\*Name\*\*:\s*(.+?)(\n|$)", block)
-            cleaned_name = re.sub(r"^\d+[\.\)]\s*", "", raw_name).strip()
-
-            dosage = extract_field(r"\*\*Dosage and Route\*\*:\s*(.+?)(\n|$)", block)
-            freq = extract_field(r"\*\*Frequency and Duration\*\*:\s*(.+?)(\n|$)", block)
-            refills = extract_field(r"\*\*Refills\*\*:\s*(.+?)(\n|$)", block)
-
-            instr_match = re.search(r"\*\*(?:Special Instructions|Special Instructions or Warnings)\*\*:\s*(.+?)(\n|$)", block)
-            instructions = instr_match.group(1).strip() if instr_match else ""
-
-            meds.append({
-                "name": cleaned_name,
-                "brand_names": [],
-                "dosage_and_route": dosage,
-                "frequency_and_duration": freq,
-                "refills": refills,
-                "special_instructions": instructions
+from bisect import bisect_left
+from typing import Dict
+
+# Every "**Name**" marker the parser cares about, found in one scan. The
+# lookahead leaves markers that share "**" findable; case is checked per use,
+# since section boundaries are case-sensitive and the header fields are not.
+MARKER_NAMES = ["Medication", "Non-Pharmacological Recommendations", "Medical Tests Recommended",
+                "Follow-Up", "Prescriber", "Patient Information", "Diagnosis", "Date"]
+MARKER_RE = re.compile(r"\*\*(?=(?i:" + "|".join(f"({re.escape(n)})" for n in MARKER_NAMES) + r")\*\*)")
+
+# each list section runs until the first of these markers after it
+SECTION_ENDS = {
+    "Medication": ["Non-Pharmacological Recommendations", "Medical Tests Recommended", "Follow-Up", "Prescriber"],
+    "Non-Pharmacological Recommendations": ["Medical Tests Recommended", "Follow-Up", "Prescriber"],
+    "Medical Tests Recommended": ["Follow-Up", "Prescriber"],
+}
+
+FIELD_FLAGS = re.IGNORECASE | re.DOTALL
+FIELD_RES = {
+    "Patient Information": re.compile(r"\*\*Patient Information\*\*:\s*([\w\s]+),", FIELD_FLAGS),
+    "Date": re.compile(r"\*\*Date\*\*:\s*(.+?)(?=\n\*\*|$)", FIELD_FLAGS),
+    "Diagnosis": re.compile(r"\*\*Diagnosis\*\*:\s*(.*?)(?=\n\*\*|$)", FIELD_FLAGS),
+    "Prescriber": re.compile(r"\*\*Prescriber\*\*:\s*(.+?)(?=\n|$)", FIELD_FLAGS),
+}
+AGE_RE = re.compile(r",\s*(\d+)\s*years? old", FIELD_FLAGS)
+GENDER_RE = re.compile(r"Gender:\s*([A-Za-z]+)", FIELD_FLAGS)
+
+MED_SPLIT_RE = re.compile(r"(?:\n|^)\s*(?:\d+[\.\)]|\-|\*)\s*(?=\*\*Name\*\*:)")
+MED_NAME_RE = re.compile(r"\*\*Name\*\*:\s*(.+?)(\n|$)", FIELD_FLAGS)
+MED_DOSAGE_RE = re.compile(r"\*\*Dosage and Route\*\*:\s*(.+?)(\n|$)", FIELD_FLAGS)
+MED_FREQUENCY_RE = re.compile(r"\*\*Frequency and Duration\*\*:\s*(.+?)(\n|$)", FIELD_FLAGS)
+MED_REFILLS_RE = re.compile(r"\*\*Refills\*\*:\s*(.+?)(\n|$)", FIELD_FLAGS)
+MED_INSTRUCTIONS_RE = re.compile(r"\*\*(?:Special Instructions|Special Instructions or Warnings)\*\*:\s*(.+?)(\n|$)")
+NUMBER_PREFIX_RE = re.compile(r"^\d+[\.\)]\s*")
+LIST_ITEM_RE = re.compile(r"^(?:\d+[\.\)]|\-|\*)\s*(\*\*(.+?)\*\*:)?\s*(.+)")
+
+
+def scan_markers(text):
+    # exact-case positions of section markers, and positions of header fields
+    # (any case) that are followed by a colon
+    sections = {name: [] for name in MARKER_NAMES}
+    fields = {name: [] for name in FIELD_RES}
+    for m in MARKER_RE.finditer(text):
+        index = m.lastindex
+        name = MARKER_NAMES[index - 1]
+        if m.group(index) == name:
+            sections[name].append(m.start())
+        if name in fields and text.startswith(":", m.end(index) + 2):
+            fields[name].append(m.start())
+    return sections, fields
+
+
+def section_text(text, sections, name):
+    # What r"\*\*Name\*\*:?(.*?)(<ends>|$)" with DOTALL captures, or None
+    if not sections[name]:
+        return None
+    start = sections[name][0] + len(name) + 4
+    if text.startswith(":", start):
+        start += 1
+    # `$` also matches before a final newline
+    end = max(start, len(text) - 1 if text.endswith("\n") else len(text))
+    for other in SECTION_ENDS[name]:
+        positions = sections[other]
+        i = bisect_left(positions, start)
+        if i < len(positions):
+            end = min(end, positions[i])
+    return text[start:end]
+
+
+def field_match(text, fields, name):
+    # same as FIELD_RES[name].search(text): every match starts at a marker
+    for pos in fields[name]:
+        match = FIELD_RES[name].match(text, pos)
+        if match:
+            return match.group(1).strip()
+    return ""
+
+
+def search_field(pattern, source, default=""):
+    match = pattern.search(source)
+    return match.group(1).strip() if match else default
+
+
+def parse_medications(section):
+    if not section or "Not applicable" in section or "No medication prescribed" in section:
+        return []
+
+    meds = []
+    for block in MED_SPLIT_RE.split(section.strip()):
+        block = block.strip()
+        if not block:
+            continue
+
+        if not block.startswith("**Name**:"):
+            block = "**Name**: " + block
+
+        raw_name = search_field(MED_NAME_RE, block)
+        instr_match = MED_INSTRUCTIONS_RE.search(block)
+
+        meds.append({
+            "name": NUMBER_PREFIX_RE.sub("", raw_name).strip(),
+            "brand_names": [],
+            "dosage_and_route": search_field(MED_DOSAGE_RE, block),
+            "frequency_and_duration": search_field(MED_FREQUENCY_RE, block),
+            "refills": search_field(MED_REFILLS_RE, block),
+            "special_instructions": instr_match.group(1).strip() if instr_match else ""
+        })
+
+    return meds
+
+
+def parse_list(section, title_key):
+    # "- **Title**: detail" / "1. detail" lines; the title defaults to the detail
+    if not section:
+        return []
+    items = []
+    for line in section.strip().split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        match = LIST_ITEM_RE.match(line)
+        if match:
+            detail = match.group(3).strip()
+            items.append({
+                title_key: match.group(2).strip() if match.group(2) else detail,
+                "details": {"text": detail}
             })
+    return items
 
-        return meds
-
-
-
-
-    def extract_non_pharm_recommendations(section: str) -> List[Dict]:
-        if not section:
-            return []
-        recommendations = []
-        lines = section.strip().split("\n")
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            match = re.match(r"^(?:\d+[\.\)]|\-|\*)\s*(\*\*(.+?)\*\*:)?\s*(.+)", line)
-            if match:
-                title = match.group(2).strip() if match.group(2) else match.group(3).strip()
-                detail = match.group(3).strip()
-                recommendations.append({
-                    "title": title,
-                    "details": {"text": detail}
-                })
-        return recommendations
-
-    def extract_medical_tests(section: str) -> List[Dict]:
-        if not section:
-            return []
-        tests = []
-        lines = section.strip().split("\n")
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            match = re.match(r"^(?:\d+[\.\)]|\-|\*)\s*(\*\*(.+?)\*\*:)?\s*(.+)", line)
-            if match:
-                title = match.group(2).strip() if match.group(2) else match.group(3).strip()
-                detail = match.group(3).strip()
-                tests.append({
-                    "test_name": title,
-                    "details": {"text": detail}
-                })
-        return tests
-
-    patient_info = {
-        "name": extract_field(r"\*\*Patient Information\*\*:\s*([\w\s]+),"),
-        "age": int(extract_field(r",\s*(\d+)\s*years? old", default="0")),
-        "gender": extract_field(r"Gender:\s*([A-Za-z]+)"),
-        "date": extract_field(r"\*\*Date\*\*:\s*(.+?)(?=\n\*\*|$)", default="")
-    }
-
-    diagnosis = extract_field(r"\*\*Diagnosis\*\*:\s*(.*?)(?=\n\*\*|$)")
 
-    med_match = re.search(
-        r"\*\*Medication\*\*:?(.*?)(\*\*Non-Pharmacological Recommendations\*\*|\*\*Medical Tests Recommended\*\*|\*\*Follow-Up\*\*|\*\*Prescriber\*\*|$)",
-        text,
-        re.DOTALL
-    )
-    medications = extract_medications(med_match.group(1)) if med_match else []
-
-    non_pharm_match = re.search(
-        r"\*\*Non-Pharmacological Recommendations\*\*:?(.*?)(\*\*Medical Tests Recommended\*\*|\*\*Follow-Up\*\*|\*\*Prescriber\*\*|$)",
-        text,
-        re.DOTALL
-    )
-    non_pharm_recs = extract_non_pharm_recommendations(non_pharm_match.group(1)) if non_pharm_match else []
-
-    test_match = re.search(
-        r"\*\*Medical Tests Recommended\*\*:?(.*?)(\*\*Follow-Up\*\*|\*\*Prescriber\*\*|$)",
-        text,
-        re.DOTALL
-    )
-    medical_tests = extract_medical_tests(test_match.group(1)) if test_match else []
+def extract_prescription_data(text: str) -> Dict:
+    sections, fields = scan_markers(text)
 
-    prescriber = extract_field(r"\*\*Prescriber\*\*:\s*(.+?)(?=\n|$)").rstrip("-").strip()
+    medication = section_text(text, sections, "Medication")
+    non_pharm = section_text(text, sections, "Non-Pharmacological Recommendations")
+    tests = section_text(text, sections, "Medical Tests Recommended")
 
     return {
-        "patient_info": patient_info,
-        "diagnosis": diagnosis,
-        "medication": medications,
-        "non_pharmacological_recommendations": non_pharm_recs,
-        "medical_tests": medical_tests,
+        "patient_info": {
+            "name": field_match(text, fields, "Patient Information"),
+            "age": int(search_field(AGE_RE, text, default="0")),
+            "gender": search_field(GENDER_RE, text),
+            "date": field_match(text, fields, "Date"),
+        },
+        "diagnosis": field_match(text, fields, "Diagnosis"),
+        "medication": parse_medications(medication) if medication is not None else [],
+        "non_pharmacological_recommendations": parse_list(non_pharm, "title") if non_pharm is not None else [],
+        "medical_tests": parse_list(tests, "test_name") if tests is not None else [],
         "prescriber": {
-            "name": prescriber
+            "name": field_match(text, fields, "Prescriber").rstrip("-").strip()
         }
-    }
\ No newline at end of file
+    }
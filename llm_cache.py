@@ -0,0 +1,159 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from disk_cache import DiskCache
+
+
+# In-process LRU with the same get/put/stats interface as DiskCache.
+class MemoryCache:
+    def __init__(self, max_entries=256, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, data):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), data)
+            self._entries.move_to_end(key)
+            while self.max_entries is not None and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def request_key(model, messages, params):
+    # whitespace differences in prompts should not defeat the cache
+    normalized = [[m["role"], " ".join(m["content"].split())] for m in messages]
+    return DiskCache.key(model, json.dumps(params, sort_keys=True), json.dumps(normalized))
+
+
+# One upstream call that any number of callers can follow from the start.
+class _InFlight:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def add(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self):
+        seen = 0
+        while True:
+            with self._cond:
+                while seen == len(self.chunks) and not self.done:
+                    self._cond.wait()
+                new, done, error = self.chunks[seen:], self.done, self.error
+            seen += len(new)
+            yield from new
+            if done and seen == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+# Caches completed LLM responses by model, parameters and normalized messages,
+# and joins identical requests that are still running instead of sending them
+# again. The upstream call runs on its own thread, so it completes (and is
+# cached) even when the Streamlit run that started it is interrupted.
+class LLMResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.joined = 0
+        self.seconds_saved = 0.0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def stream(self, model, messages, params, call):
+        # `call()` returns an iterator of text deltas
+        key = request_key(model, messages, params)
+        cached = self.backend.get(key)
+        if cached is not None:
+            entry = json.loads(cached)
+            with self._lock:
+                self.seconds_saved += entry["seconds"]
+            yield entry["text"]
+            return
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.joined += 1
+            else:
+                flight = self._inflight[key] = _InFlight()
+                threading.Thread(target=self._fetch, args=(key, flight, call), name="llm-fetch",
+                                 daemon=True).start()
+        yield from flight.follow()
+
+    def _fetch(self, key, flight, call):
+        start = time.perf_counter()
+        error = None
+        try:
+            for chunk in call():
+                flight.add(chunk)
+            text = "".join(flight.chunks)
+            if text:
+                self.backend.put(key, json.dumps({"text": text, "seconds": time.perf_counter() - start}).encode("utf-8"))
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.finish(error)
+
+    def stats(self):
+        stats = self.backend.stats()
+        with self._lock:
+            stats.update(joined=self.joined, seconds_saved=self.seconds_saved, in_flight=len(self._inflight))
+        return stats
+
+
+def new_response_cache(backend=None):
+    backend = backend or config.LLM_CACHE_BACKEND
+    if backend == "memory":
+        store = MemoryCache(config.LLM_CACHE_MAX_ENTRIES, config.LLM_CACHE_TTL_SECONDS)
+    elif backend == "disk":
+        store = DiskCache(config.LLM_CACHE_DIR, max_entries=config.LLM_CACHE_MAX_ENTRIES,
+                          ttl_seconds=config.LLM_CACHE_TTL_SECONDS, suffix=".json")
+    else:
+        raise ValueError(f"Unknown LLM cache backend: {backend} (expected 'memory' or 'disk')")
+    return LLMResponseCache(store)
@@ -0,0 +1,229 @@
+import asyncio
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, APITimeoutError
+
+import config
+
+_DONE = object()
+
+
+class LLMTimeout(Exception):
+    pass
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _retryable(error):
+    if isinstance(error, (APITimeoutError, APIConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+# Async OpenAI-compatible client shared by every session in the process. It
+# runs its own event loop on a background thread, so the client's keep-alive
+# connections are reused across sessions.
+# A semaphore bounds in-flight requests. Each call has a deadline that starts
+# when it is queued, and is retried with jittered exponential backoff on
+# 429/5xx, timeouts and connection errors; no backoff sleep outlasts
+# max_backoff or the time left before the deadline.
+class LLMPool:
+    def __init__(self, base_url, api_key, max_concurrency=None, timeout=None, max_retries=None,
+                 backoff=None, max_backoff=30.0, stream_timeout=None):
+        self.max_concurrency = max_concurrency or config.LLM_MAX_CONCURRENCY
+        self.timeout = timeout or config.LLM_TIMEOUT
+        self.stream_timeout = stream_timeout or config.LLM_STREAM_TIMEOUT
+        self.max_retries = config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = backoff or config.LLM_BACKOFF
+        self.max_backoff = max_backoff
+        self.records = deque(maxlen=1000)
+        self._records_lock = threading.Lock()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-pool", daemon=True)
+        self._thread.start()
+
+        async def setup():
+            # retries are handled here, so the SDK's own are disabled
+            client = AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0, timeout=self.timeout)
+            return client, asyncio.Semaphore(self.max_concurrency)
+
+        self._client, self._semaphore = self._run(setup())
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def _record(self, **record):
+        with self._records_lock:
+            self.records.append(record)
+
+    async def _backoff(self, attempt, error, deadline):
+        delay = _retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, self.backoff * 2 ** attempt)
+        await asyncio.sleep(max(0, min(delay, self.max_backoff, deadline - time.monotonic())))
+
+    async def _acquire(self, enqueued, deadline):
+        # waiting for a free slot counts against the call's deadline
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), max(0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self._record(ok=False, queue_wait=time.monotonic() - enqueued, latency=0, attempts=0,
+                         error="LLMTimeout")
+            raise LLMTimeout(f"no free LLM slot after {time.monotonic() - enqueued:.0f}s") from None
+        except asyncio.CancelledError:
+            self._record(ok=False, cancelled=True, queue_wait=time.monotonic() - enqueued, latency=0,
+                         attempts=0, error="cancelled")
+            raise
+
+    async def acomplete(self, messages, model, **params):
+        # the deadline starts when the call is queued, not when it gets a slot
+        enqueued = time.monotonic()
+        deadline = enqueued + self.timeout
+        await self._acquire(enqueued, deadline)
+        try:
+            started = time.monotonic()
+            attempt = 0
+            while True:
+                try:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise LLMTimeout(f"no response within {self.timeout:.0f}s")
+                    response = await asyncio.wait_for(
+                        self._client.chat.completions.create(model=model, messages=messages, **params),
+                        remaining)
+                    self._record(ok=True, queue_wait=started - enqueued,
+                                 latency=time.monotonic() - started, attempts=attempt + 1)
+                    return response.choices[0].message.content
+                except Exception as e:
+                    if not _retryable(e) or attempt >= self.max_retries or time.monotonic() >= deadline:
+                        self._record(ok=False, queue_wait=started - enqueued,
+                                     latency=time.monotonic() - started, attempts=attempt + 1,
+                                     error=type(e).__name__)
+                        if isinstance(e, asyncio.TimeoutError):
+                            raise LLMTimeout(f"no response within {self.timeout:.0f}s") from e
+                        raise
+                    await self._backoff(attempt, e, deadline)
+                    attempt += 1
+        except (asyncio.CancelledError, GeneratorExit):
+            # the caller gave up (an abandoned stream); counted, but not as a failure
+            self._record(ok=False, cancelled=True, queue_wait=started - enqueued,
+                         latency=time.monotonic() - started, attempts=attempt + 1, error="cancelled")
+            raise
+        finally:
+            self._semaphore.release()
+
+    async def astream(self, messages, model, **params):
+        # Retries only until the first token. The whole stream, queueing
+        # included, must finish within stream_timeout; the timeout also bounds
+        # the wait for the first token and every gap between tokens after it.
+        enqueued = time.monotonic()
+        deadline = enqueued + self.stream_timeout
+        await self._acquire(enqueued, deadline)
+        try:
+            started = time.monotonic()
+            attempt = 0
+            first_token = None
+            while True:
+                try:
+                    stream = await asyncio.wait_for(
+                        self._client.chat.completions.create(model=model, messages=messages, stream=True, **params),
+                        self._gap(deadline))
+                    try:
+                        chunks = stream.__aiter__()
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), self._gap(deadline))
+                            except StopAsyncIteration:
+                                break
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                first_token = first_token or time.monotonic()
+                                yield chunk.choices[0].delta.content
+                    finally:
+                        await stream.close()
+                    self._record(ok=True, queue_wait=started - enqueued, latency=time.monotonic() - started,
+                                 first_token=first_token - started if first_token else None, attempts=attempt + 1)
+                    return
+                except Exception as e:
+                    if (first_token or not _retryable(e) or attempt >= self.max_retries
+                            or time.monotonic() >= deadline):
+                        self._record(ok=False, queue_wait=started - enqueued, latency=time.monotonic() - started,
+                                     attempts=attempt + 1, error=type(e).__name__)
+                        if isinstance(e, asyncio.TimeoutError):
+                            if time.monotonic() >= deadline:
+                                raise LLMTimeout(f"stream not finished within {self.stream_timeout:.0f}s") from e
+                            raise LLMTimeout(f"no tokens for {self.timeout:.0f}s") from e
+                        raise
+                    await self._backoff(attempt, e, deadline)
+                    attempt += 1
+        except (asyncio.CancelledError, GeneratorExit):
+            # the caller gave up (an abandoned stream); counted, but not as a failure
+            self._record(ok=False, cancelled=True, queue_wait=started - enqueued,
+                         latency=time.monotonic() - started, attempts=attempt + 1, error="cancelled")
+            raise
+        finally:
+            self._semaphore.release()
+
+    def _gap(self, deadline):
+        return max(0, min(self.timeout, deadline - time.monotonic()))
+
+    def stream(self, messages, model, **params):
+        # blocking generator over astream() for the Streamlit script thread
+        deltas = queue.Queue()
+
+        async def pump():
+            try:
+                async for delta in self.astream(messages, model, **params):
+                    deltas.put(delta)
+            except Exception as e:
+                deltas.put(e)
+            finally:
+                deltas.put(_DONE)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = deltas.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # a consumer that stops reading (rerun, closed generator) cancels
+            # the request, so it does not hold a concurrency slot to the end
+            future.cancel()
+
+    def summary(self):
+        with self._records_lock:
+            records = list(self.records)
+        if not records:
+            return {"requests": 0}
+
+        def pct(values, p):
+            values = sorted(values)
+            return values[int(p * (len(values) - 1))] if values else None
+
+        waits = [r["queue_wait"] for r in records]
+        latencies = [r["latency"] for r in records if r["ok"]]
+        return {
+            "requests": len(records),
+            "failed": sum(not r["ok"] and not r.get("cancelled") for r in records),
+            "cancelled": sum(bool(r.get("cancelled")) for r in records),
+            "retried": sum(r["attempts"] > 1 for r in records),
+            "queue_wait_p50": pct(waits, 0.5),
+            "queue_wait_p95": pct(waits, 0.95),
+            "latency_p50": pct(latencies, 0.5),
+            "latency_p95": pct(latencies, 0.95),
+        }
@@ -0,0 +1,76 @@
+import re
+
+
+# Incremental version of
+#     [q.strip() + "?" for q in text.split("?") if q.strip()]
+# that hands out each question as soon as its "?" arrives.
+class QuestionSplitter:
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, delta):
+        self.buffer += delta
+        *done, self.buffer = self.buffer.split("?")
+        return [q.strip() + "?" for q in done if q.strip()]
+
+    def close(self):
+        rest, self.buffer = self.buffer, ""
+        return [rest.strip() + "?"] if rest.strip() else []
+
+
+PRESCRIPTION_SECTIONS = [
+    "Medical Prescription", "Patient Information", "Date", "Diagnosis", "Medication",
+    "Non-Pharmacological Recommendations", "Medical Tests Recommended", "Follow-Up",
+    "Reasoning", "Prescriber",
+]
+SECTION_HEADER = re.compile(
+    r"^[ \t]*(?:[-*][ \t]+)?(\*\*(" + "|".join(re.escape(s) for s in PRESCRIPTION_SECTIONS) + r")\*\*)",
+    re.MULTILINE,
+)
+
+
+# Splits a streamed prescription into its top-level "**Title**" sections.
+# feed() returns (title, body) for every section the new text has closed,
+# i.e. whose next header has started; `starts` maps each header seen so far
+# to the offset of its "**".
+class SectionSplitter:
+    def __init__(self):
+        self.text = ""
+        self.starts = {}
+        self._scanned = 0
+        self._current = None
+
+    def feed(self, delta):
+        self.text += delta
+        return self._scan(partial=True)
+
+    def close(self):
+        completed = self._scan()
+        completed.extend(self._close(len(self.text)))
+        self._current = None
+        return completed
+
+    def _scan(self, partial=False):
+        # A header counts as soon as its closing "**" has arrived and more
+        # text follows, even if the rest of its line is still streaming.
+        # Scanning resumes at the unfinished last line so a half-streamed
+        # header is matched on a later feed.
+        completed = []
+        resume = max(self._scanned, self.text.rfind("\n") + 1) if partial else len(self.text)
+        for match in SECTION_HEADER.finditer(self.text, self._scanned):
+            if partial and match.end() >= len(self.text):
+                break
+            completed.extend(self._close(match.start(1)))
+            title = match.group(2)
+            self.starts.setdefault(title, match.start(1))
+            self._current = (title, match.end(1))
+            resume = max(resume, match.end())
+        self._scanned = resume
+        return completed
+
+    def _close(self, end):
+        if self._current is None:
+            return []
+        title, body_start = self._current
+        self._current = None
+        return [(title, self.text[body_start:end].lstrip(":").strip())]
@@ -0,0 +1,219 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUESTIONS_RESPONSE = (
+    "Your X-ray shows no fracture on the elbow.\n"
+    "When did the pain start?\n"
+    "Did you fall or hurt your arm recently?\n"
+    "Is the pain sharp or dull?\n"
+    "Does the pain get worse when you move your arm?\n"
+    "Do you have any swelling or bruising?\n"
+    "Do you have a fever?\n"
+    "Are you taking any medicines right now?\n"
+    "Do you have any allergies to medicines?\n"
+)
+
+PRESCRIPTION_RESPONSE = """---
+**Medical Prescription**
+
+**Patient Information**: Test Patient, 30 years old, Gender: Male
+**Date**: January 01, 2025
+
+**Diagnosis**: Soft tissue strain of the right elbow
+
+**Medication**:
+- **Name**: Ibuprofen (Brufen)
+- **Dosage and Route**: 400mg orally
+- **Frequency and Duration**: Three times a day for 5 days
+- **Refills**: None
+- **Special Instructions**: Take with food
+
+**Non-Pharmacological Recommendations**
+- **Rest**: Avoid heavy lifting for one week
+- **Ice**: Apply ice for 15 minutes three times a day
+
+**Medical Tests Recommended**
+- **None**: No further tests needed at this time
+
+**Reasoning**: Your X-ray shows no broken bone, so the pain is most likely from a strained muscle. Ibuprofen will reduce the pain and swelling while it heals.
+
+**Prescriber**: Dr. AI Medic. MD
+---
+"""
+
+
+def canned_response(messages):
+    last = messages[-1]["content"] if messages else ""
+    return PRESCRIPTION_RESPONSE if "medical prescription" in last.lower() else QUESTIONS_RESPONSE
+
+
+def tokenize(text):
+    # roughly word-sized chunks, whitespace kept, like a real token stream
+    tokens, current = [], ""
+    for ch in text:
+        current += ch
+        if ch in " \n":
+            tokens.append(current)
+            current = ""
+    if current:
+        tokens.append(current)
+    return tokens
+
+
+# Stand-in for an OpenAI-compatible /chat/completions endpoint. Latency and
+# streaming pace are set per server; `jitter` adds up to that many seconds to
+# the first-token delay and `error_rate` answers that fraction of requests
+# with a random 429/500/503.
+class MockLLMServer:
+    def __init__(self, host="127.0.0.1", port=0, first_token_delay=0.5, token_delay=0.02,
+                 jitter=0.0, error_rate=0.0, error_codes=(429, 500, 503)):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_codes = error_codes
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with server._lock:
+                    server.requests += 1
+                try:
+                    server.handle_completion(self, body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client cancelled the request mid-stream
+                    self.close_connection = True
+
+        return Handler
+
+    def handle_completion(self, handler, body):
+        text = canned_response(body.get("messages", []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "mock")
+        created = int(time.time())
+        if random.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            self.send_error(handler, random.choice(self.error_codes))
+            return
+        time.sleep(self.first_token_delay + random.uniform(0, self.jitter))
+
+        if not body.get("stream"):
+            time.sleep(self.token_delay * len(tokenize(text)))
+            payload = json.dumps({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokenize(text)), "total_tokens": 0},
+            }).encode("utf-8")
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(payload)))
+            handler.end_headers()
+            handler.wfile.write(payload)
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+
+        def send(delta, finish_reason=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            handler.wfile.flush()
+
+        send({"role": "assistant", "content": ""})
+        for i, token in enumerate(tokenize(text)):
+            if i:
+                time.sleep(self.token_delay)
+            send({"content": token})
+        send({}, "stop")
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+        handler.close_connection = True
+
+    def send_error(self, handler, status):
+        payload = json.dumps({"error": {"message": "simulated failure", "code": status}}).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        if status == 429:
+            handler.send_header("Retry-After", "0.1")
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-token-delay", type=float, default=0.5)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random first-token delay (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 429/5xx")
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, args.first_token_delay, args.token_delay,
+                           jitter=args.jitter, error_rate=args.error_rate)
+    print(f"Serving on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import gc
+import os
+import resource
+import threading
+import time
+
+# a loader may return None (e.g. a feature that turned out to be unavailable)
+_MISSING = object()
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # peak rather than current RSS, but still useful for sizing
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Loads heavy models on first use instead of at import time. Each model is
+# loaded at most once; concurrent callers wait on the same load. Unloading
+# calls the model's close() if it has one.
+class ModelRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._depends = {}
+        self._stats = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def register(self, name, loader, depends_on=()):
+        # depends_on: models a composite entry holds on to; using the entry
+        # counts as using them, so the reaper never drops them from under it
+        with self._lock:
+            self._loaders[name] = loader
+            self._depends[name] = tuple(depends_on)
+            self._locks.setdefault(name, threading.Lock())
+            self._stats.setdefault(name, {
+                "loaded": False,
+                "loads": 0,
+                "load_seconds": None,
+                "rss_delta_bytes": None,
+                "last_used": None,
+            })
+
+    def get(self, name):
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+        stats = self._stats[name]
+        # the reaper may unload between any two reads, so read once
+        model = self._models.get(name, _MISSING)
+        if model is _MISSING:
+            with self._locks[name]:
+                model = self._models.get(name, _MISSING)
+                if model is _MISSING:
+                    rss_before = rss_bytes()
+                    start = time.perf_counter()
+                    model = self._models[name] = self._loaders[name]()
+                    stats["load_seconds"] = time.perf_counter() - start
+                    stats["rss_delta_bytes"] = rss_bytes() - rss_before
+                    stats["loads"] += 1
+                    stats["loaded"] = True
+                    print(f"Loaded {name} in {stats['load_seconds']:.1f}s "
+                          f"(+{stats['rss_delta_bytes'] / 2 ** 20:.0f} MiB RSS)")
+        self._touch(name)
+        return model
+
+    def _touch(self, name):
+        now = time.monotonic()
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            self._stats[current]["last_used"] = now
+            pending.extend(self._depends.get(current, ()))
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def unload(self, name):
+        with self._locks[name]:
+            if name not in self._models:
+                return
+            # a loader may have returned None; the entry is still reset
+            model = self._models.pop(name)
+            self._stats[name]["loaded"] = False
+            self._stats[name]["last_used"] = None
+            if model is not None:
+                # models that own threads or processes release them here
+                if hasattr(model, "close"):
+                    model.close()
+                gc.collect()
+            print(f"Unloaded {name}")
+
+    def unload_idle(self, max_idle_seconds):
+        now = time.monotonic()
+        for name in list(self._models):
+            last_used = self._stats[name]["last_used"]
+            if last_used is not None and now - last_used > max_idle_seconds:
+                self.unload(name)
+
+    def warmup(self, names=None, background=True):
+        names = [n for n in (names or list(self._loaders)) if n in self._loaders]
+
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"Warmup of {name} failed: {e}")
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def start_idle_reaper(self, max_idle_seconds, interval=None):
+        if self._reaper is not None or max_idle_seconds <= 0:
+            return
+        interval = interval or max(1.0, max_idle_seconds / 4)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.unload_idle(max_idle_seconds)
+
+        self._reaper = threading.Thread(target=run, name="model-reaper", daemon=True)
+        self._reaper.start()
+
+    def stats(self):
+        return {name: dict(s) for name, s in self._stats.items()}
+
+    def report(self):
+        lines = []
+        for name, s in self.stats().items():
+            if s["load_seconds"] is None:
+                lines.append(f"{name}: not loaded")
+                continue
+            state = "loaded" if s["loaded"] else "unloaded"
+            lines.append(f"{name}: {state}, load {s['load_seconds']:.1f}s, "
+                         f"+{s['rss_delta_bytes'] / 2 ** 20:.0f} MiB RSS, loads={s['loads']}")
+        return "\n".join(lines)
+
+
+registry = ModelRegistry()
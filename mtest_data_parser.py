@@ -1,62 +1,130 @@
 import json
 import numpy as np
 
-def extract_text_from_json(json_path):
-    with open(json_path) as f:
-        data = json.load(f)
-
-    texts = data['rec_texts']
-    boxes = data['rec_boxes']  
-
-    entries = []
-    for i, box in enumerate(boxes):
-        x_min, y_min, x_max, y_max = box
-        center_y = (y_min + y_max) / 2
-        entries.append({
-            'text': texts[i],
-            'y_min': y_min,
-            'y_max': y_max,
-            'x_min': x_min,
-            'x_max': x_max,
-            'center_y': center_y
-        })
-
-    sorted_entries = sorted(entries, key=lambda e: e['center_y'])
-    rows = []
-    current_row = [sorted_entries[0]]
-
-    for entry in sorted_entries[1:]:
-        last_in_row = current_row[-1]
-        y_overlap = (min(entry['y_max'], last_in_row['y_max']) -
-                     max(entry['y_min'], last_in_row['y_min']))
-        height = min(entry['y_max'] - entry['y_min'],
-                     last_in_row['y_max'] - last_in_row['y_min'])
-
-        if y_overlap > height * 0.6:
-            current_row.append(entry)
-        else:
-            rows.append(sorted(current_row, key=lambda e: e['x_min']))
-            current_row = [entry]
-
-    rows.append(sorted(current_row, key=lambda e: e['x_min']))
-
-    output_lines = []
-    for row in rows:
-        line_parts = []
-        current_x = 0
-
-        for i, entry in enumerate(row):
-            if entry['x_min'] > current_x and i > 0:
-                gap = entry['x_min'] - current_x
-                line_parts.append(' ' * max(1, int(gap / 10)))
-
-            line_parts.append(entry['text'])
-            current_x = entry['x_max']
-
-        output_lines.append(''.join(line_parts))
-
-    txt = ''
-    for line in output_lines:
-        txt+=line + '\n'
-
-    return txt
\ No newline at end of file
+# source: path to a PaddleOCR JSON file, its bytes, or the parsed dict
+def extract_text_from_json(source, detect_columns=False):
+    if isinstance(source, dict):
+        data = source
+    elif isinstance(source, (bytes, bytearray)):
+        data = json.loads(source)
+    else:
+        with open(source) as f:
+            data = json.load(f)
+
+    return layout_text(data['rec_texts'], data['rec_boxes'], detect_columns=detect_columns)
+
+
+def extract_text_from_ocr(pages, detect_columns=False):
+    return '\n'.join(layout_text(page['rec_texts'], page['rec_boxes'], detect_columns=detect_columns)
+                     for page in pages)
+
+
+def estimate_skew(boxes):
+    # Median dy/dx between boxes that follow each other in PaddleOCR's reading
+    # order and sit on the same line. Returns 0 unless there is enough evidence
+    # and the tilt would move a line by a quarter of its height across the page.
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    h = boxes[:, 3] - boxes[:, 1]
+    dx, dy = np.diff(cx), np.diff(cy)
+    same_line = (dx > 0) & (np.abs(dy) < np.minimum(h[1:], h[:-1]))
+    if same_line.sum() < 10:
+        return 0.0
+    slope = float(np.median(dy[same_line] / dx[same_line]))
+    page_width = boxes[:, 2].max() - boxes[:, 0].min()
+    if abs(slope) * page_width < 0.25 * np.median(h):
+        return 0.0
+    return slope
+
+
+def group_rows(boxes, min_overlap=0.6):
+    # Row id per box, plus the centre-y order. A box joins the row of the box
+    # above it when their vertical overlap exceeds min_overlap of the smaller height.
+    x_min, y_min, x_max, y_max = boxes.T
+    shift = estimate_skew(boxes) * (x_min + x_max) / 2
+    y_min, y_max = y_min - shift, y_max - shift
+
+    order = np.argsort((y_min + y_max) / 2, kind='stable')
+    top, bottom = y_min[order], y_max[order]
+    overlap = np.minimum(bottom[1:], bottom[:-1]) - np.maximum(top[1:], top[:-1])
+    height = np.minimum(bottom[1:] - top[1:], bottom[:-1] - top[:-1])
+    new_row = np.concatenate([[True], overlap <= height * min_overlap])
+
+    rows = np.empty(len(boxes), dtype=np.int64)
+    rows[order] = np.cumsum(new_row) - 1
+    return rows, order
+
+
+def column_anchors(x_min, rows, char_width, min_rows=3):
+    # Left edges (in pixels) that many rows share: x_min is binned to one
+    # character, each bin counts the distinct rows starting a box there
+    # (smoothed over its neighbours), and local peaks above the threshold win.
+    bins = (x_min // char_width).astype(np.int64)
+    n_rows = rows.max() + 1
+    pairs = np.unique(bins * n_rows + rows)
+    support = np.bincount(pairs // n_rows).astype(np.float64)
+    smooth = support + np.concatenate([[0], support[:-1]]) + np.concatenate([support[1:], [0]])
+
+    left = np.concatenate([[-1], smooth[:-1]])
+    right = np.concatenate([smooth[1:], [-1]])
+    threshold = max(min_rows, 0.05 * n_rows)
+    peaks = np.flatnonzero((smooth >= threshold) & (smooth > left) & (smooth >= right))
+    return peaks * char_width
+
+
+def layout_text(texts, boxes, char_width=10, detect_columns=False):
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return ''
+
+    rows, by_y = group_rows(boxes)
+    order = by_y[np.lexsort((boxes[by_y, 0], rows[by_y]))]
+    rows = rows[order]
+    x_min, x_max = boxes[order, 0], boxes[order, 2]
+    texts = [texts[i] for i in order]
+    row_start = np.concatenate([[True], rows[1:] != rows[:-1]])
+
+    if detect_columns:
+        anchors = column_anchors(x_min, rows, char_width)
+        if len(anchors) >= 2:
+            return _layout_columns(texts, x_min, row_start, anchors, char_width)
+    return _layout_plain(texts, x_min, x_max, row_start, char_width)
+
+
+def _layout_plain(texts, x_min, x_max, row_start, char_width):
+    # spaces between neighbours in a row, proportional to the pixel gap
+    gap = np.concatenate([[0.0], x_min[1:] - x_max[:-1]])
+    pad = np.where(gap > 0, np.maximum(1, (gap / char_width).astype(np.int64)), 0)
+    pad[row_start] = 0
+
+    pieces = [' ' * p + t if p else t for p, t in zip(pad.tolist(), texts)]
+    bounds = np.append(np.flatnonzero(row_start), len(pieces)).tolist()
+    lines = [''.join(pieces[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+    return '\n'.join(lines) + '\n'
+
+
+def _layout_columns(texts, x_min, row_start, anchors, char_width):
+    # Align cells on the detected columns so values stay under their test names.
+    col = np.maximum(np.searchsorted(anchors, x_min + char_width, side='right') - 1, 0)
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    # only cells with a neighbour to their right push the next column over
+    followed = np.append(~row_start[1:], False)
+    widths = np.zeros(len(anchors), dtype=np.int64)
+    np.maximum.at(widths, col[followed], lengths[followed])
+    col_start = np.concatenate([[0], np.cumsum(widths + 2)[:-1]])
+
+    lines = []
+    line = None
+    for text, c, first in zip(texts, col.tolist(), row_start.tolist()):
+        if first:
+            if line is not None:
+                lines.append(line)
+            line = ''
+        target = int(col_start[c])
+        if line:
+            line += ' ' * max(1, target - len(line))
+        elif c:
+            line = ' ' * target
+        line += text
+    lines.append(line)
+    return '\n'.join(lines) + '\n'
@@ -1,13 +1,169 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
 from paddleocr import PaddleOCR
-ocr = PaddleOCR(
-    use_doc_orientation_classify=False,
-    use_doc_unwarping=False,
-    use_textline_orientation=False)
 
-def perform_ocr(path_to_test):
+import config
+from model_registry import registry
+from mtest_data_parser import layout_text
+
+
+def new_ocr():
+    return PaddleOCR(
+        use_doc_orientation_classify=False,
+        use_doc_unwarping=False,
+        use_textline_orientation=False)
+
+
+registry.register("paddleocr", new_ocr)
+
+
+def decode_image(data):
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode test report image")
+    return img
+
+
+# source: file path, encoded image bytes or a BGR array. Returns one
+# {"rec_texts", "rec_boxes"} dict per page, the same fields save_to_json writes.
+def perform_ocr(source, debug_dir=None):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = decode_image(source)
+    debug_dir = debug_dir or config.OCR_DEBUG_DIR
+
+    ocr = registry.get("paddleocr")
     result = ocr.predict(
-        input=path_to_test)
+        input=source)
 
+    pages = []
     for res in result:
-        res.save_to_img("output")
-        res.save_to_json("output")
+        if debug_dir:
+            res.save_to_img(debug_dir)
+            res.save_to_json(debug_dir)
+        pages.append({
+            "rec_texts": list(res["rec_texts"]),
+            "rec_boxes": np.asarray(res["rec_boxes"]).tolist(),
+        })
+    return pages
+
+
+def is_pdf(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:5]) == b"%PDF-"
+    return isinstance(source, str) and source.lower().endswith(".pdf")
+
+
+# Splits report files (paths or bytes; PDFs and images) into page images, in order.
+def split_pages(sources, dpi=None):
+    dpi = dpi or config.OCR_PDF_DPI
+    for source in sources:
+        if is_pdf(source):
+            import pypdfium2 as pdfium
+
+            pdf = pdfium.PdfDocument(bytes(source) if not isinstance(source, str) else source)
+            try:
+                for page in pdf:
+                    # BGR, like cv2.imdecode
+                    yield page.render(scale=dpi / 72).to_numpy()[:, :, :3].copy()
+            finally:
+                pdf.close()
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            yield decode_image(source)
+        else:
+            yield source
+
+
+# Warm PaddleOCR instances, one per worker thread (a predictor is not safe to
+# share between threads). Pages are handed out through a single queue; close()
+# lets the workers finish the queued pages and exit, freeing their instances.
+class OCRWorkerPool:
+    def __init__(self, workers=None):
+        self.workers = workers or config.OCR_WORKERS
+        self._queue = queue.Queue()
+        self._threads = []
+        self._error = None
+        self._closed = False
+        ready = threading.Barrier(self.workers + 1)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(ready,), name=f"ocr-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        ready.wait()
+        if self._error is not None:
+            self.close()
+            raise self._error
+
+    def _run(self, ready):
+        try:
+            ocr = new_ocr()
+        except Exception as e:
+            self._error = e
+            return
+        finally:
+            ready.wait()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            page, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                res = next(iter(ocr.predict(input=page)))
+                future.set_result({
+                    "rec_texts": list(res["rec_texts"]),
+                    "rec_boxes": np.asarray(res["rec_boxes"]).tolist(),
+                })
+            except Exception as e:
+                future.set_exception(e)
+
+    def submit(self, page):
+        if self._closed:
+            raise RuntimeError("OCR worker pool is closed")
+        future = Future()
+        self._queue.put((page, future))
+        return future
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+
+
+registry.register("paddleocr_pool", OCRWorkerPool)
+
+
+# Yields (page_number, text) in page order. At most `window` pages (default
+# two per worker) are rendered and queued at a time, so a long PDF is never
+# held fully rasterised and the first page's text arrives early.
+def iter_ocr_pages(sources, pool=None, window=None):
+    pool = pool or registry.get("paddleocr_pool")
+    window = window or 2 * pool.workers
+    pending = deque()
+    for page_number, page in enumerate(split_pages(sources)):
+        pending.append((page_number, pool.submit(page)))
+        if len(pending) >= window:
+            yield _page_text(*pending.popleft())
+    while pending:
+        yield _page_text(*pending.popleft())
+
+
+def _page_text(page_number, future):
+    result = future.result()
+    return page_number, layout_text(result["rec_texts"], result["rec_boxes"])
+
+
+def ocr_report_text(sources, pool=None, on_page=None):
+    texts = []
+    for page_number, text in iter_ocr_pages(sources, pool):
+        texts.append(text)
+        if on_page:
+            on_page(page_number, text)
+    return "\n".join(texts)
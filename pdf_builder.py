@@ -6,69 +6,191 @@ from reportlab.platypus import (
 )
 from reportlab.lib.units import mm
 from reportlab.lib.enums import TA_LEFT, TA_CENTER
+from reportlab import rl_config
+import copy
+import io
 import json
 import os
+import threading
 from PyPDF2 import PdfReader
 
-def build_pdf(json_path):
-    class HorizontalLine(Flowable):
-        def __init__(self, width, thickness=1, color=colors.black):
-            super().__init__()
-            self.width = width
-            self.thickness = thickness
-            self.color = color
-            self.height = thickness
-
-        def draw(self):
-            self.canv.setStrokeColor(self.color)
-            self.canv.setLineWidth(self.thickness)
-            self.canv.line(0, 0, self.width, 0)
-
-
-    class CenteredHorizontalLine(Flowable):
-        def __init__(self, total_width, line_width, thickness=1, color=colors.black):
-            super().__init__()
-            self.total_width = total_width
-            self.line_width = line_width
-            self.thickness = thickness
-            self.color = color
-            self.height = thickness
-
-        def draw(self):
-            start_x = (self.total_width - self.line_width) / 2
-            self.canv.setStrokeColor(self.color)
-            self.canv.setLineWidth(self.thickness)
-            self.canv.line(start_x, 0, start_x + self.line_width, 0)
-
-
-    def draw_footer(canvas, doc):
-        page_width = A4[0] - doc.leftMargin - doc.rightMargin
-        y = 15 * mm
-        canvas.setStrokeColor(colors.grey)
-        canvas.setLineWidth(0.5)
-        canvas.line(doc.leftMargin, y + 10, doc.leftMargin + page_width, y + 10)
+MARGIN = 20
+PAGE_WIDTH = A4[0] - 2 * MARGIN
+FOOTER_TEXT = "This digital prescription was generated by AI-powered software. Please consult your healthcare provider for any questions."
+GENERAL_INSTRUCTIONS = [
+    "Take medications exactly as prescribed. Do not skip doses.",
+    "Avoid self-medication. Consult your doctor before taking any new drugs.",
+    "Follow up as advised by your healthcare provider.",
+    "In case of any adverse reaction or allergic symptoms, seek immediate medical help.",
+    "Carry this prescription during your hospital visits.",
+]
+SECTION_TITLES = ["Patient Information", "Diagnosis", "Medications",
+                  "Non-Pharmacological Recommendations", "Medical Tests Recommended"]
+
+
+class HorizontalLine(Flowable):
+    def __init__(self, width, thickness=1, color=colors.black):
+        super().__init__()
+        self.width = width
+        self.thickness = thickness
+        self.color = color
+        self.height = thickness
+
+    def draw(self):
+        self.canv.setStrokeColor(self.color)
+        self.canv.setLineWidth(self.thickness)
+        self.canv.line(0, 0, self.width, 0)
+
+
+class CenteredHorizontalLine(Flowable):
+    def __init__(self, total_width, line_width, thickness=1, color=colors.black):
+        super().__init__()
+        self.total_width = total_width
+        self.line_width = line_width
+        self.thickness = thickness
+        self.color = color
+        self.height = thickness
+
+    def draw(self):
+        start_x = (self.total_width - self.line_width) / 2
+        self.canv.setStrokeColor(self.color)
+        self.canv.setLineWidth(self.thickness)
+        self.canv.line(start_x, 0, start_x + self.line_width, 0)
+
+
+def fits_in_frame(flowables, frame):
+    # Whether the flowables fit in one empty frame. Mirrors Frame._add: space
+    # before is dropped at the top of the frame and overlaps the previous
+    # flowable's space after.
+    width, height = frame._aW, frame._aH
+    used = 0
+    prev_after = 0
+    at_top = True
+    for flowable in flowables:
+        space = 0
+        if not at_top:
+            space = flowable.getSpaceBefore()
+            if rl_config.overlapAttachedSpace:
+                space = max(space - prev_after, 0)
+        w, h = flowable.wrap(width, height - used - space)
+        used += h + space
+        if used > height + 1e-8:
+            return False
+        prev_after = flowable.getSpaceAfter()
+        used += prev_after
+        at_top = at_top and used == 0
+    return True
+
+
+# Everything a prescription shares: styles, the logo, the heading, section
+# headers, the footer and the General Instructions. A render only builds the
+# patient-specific flowables. The platypus engine marks flowables it had to
+# push to the next page, so each render takes shallow copies of the shared
+# top-level ones; their parsed paragraphs and images are still reused, which
+# is why a template must not be used by two threads at once (see get_template).
+class PrescriptionTemplate:
+    def __init__(self, logo_path="logo.png"):
+        self.label_style = ParagraphStyle("label", fontSize=10, leading=12, alignment=TA_LEFT)
+        self.field_style = ParagraphStyle("field", fontSize=10, leading=12, alignment=TA_LEFT, wordWrap='CJK')
+        self.bullet_style = ParagraphStyle("bullet", fontSize=10, leading=14, leftIndent=10, bulletIndent=0, spaceBefore=3)
+        plain_heading_style = ParagraphStyle(
+            "plain_heading_centered",
+            fontSize=12,
+            leading=14,
+            textColor=colors.HexColor("#0c1b33"),
+            spaceBefore=12,
+            spaceAfter=3,
+            alignment=TA_CENTER
+        )
+        numbered_style = ParagraphStyle("numbered", fontSize=10, leading=14, leftIndent=20, firstLineIndent=-10, spaceBefore=3, spaceAfter=3)
+        heading_style = ParagraphStyle(
+            name="Heading",
+            fontSize=30,
+            leading=30,
+            alignment=TA_LEFT,
+            spaceAfter=6,
+            spaceBefore=6,
+            textColor=colors.HexColor("#0c1b33"),
+            leftIndent=-16
+        )
         footer_style = getSampleStyleSheet()['Normal']
         footer_style.fontSize = 9
         footer_style.leading = 10
         footer_style.textColor = colors.grey
         footer_style.alignment = TA_CENTER
-        footer_text = "This digital prescription was generated by AI-powered software. Please consult your healthcare provider for any questions."
-        p = Paragraph(footer_text, footer_style)
-        w, h = p.wrap(page_width, 50)
-        p.drawOn(canvas, doc.leftMargin, y - h)
 
+        self.footer = Paragraph(FOOTER_TEXT, footer_style)
+        self.footer_height = self.footer.wrap(PAGE_WIDTH, 50)[1]
+
+        # the image is decoded on first draw and kept by the flowable
+        logo = Image(logo_path)
+        logo.drawHeight = 100
+        logo.drawWidth = 100
+        self.heading = [
+            Table(
+                [[Paragraph("<b>MEDICAL</b><br/>PRESCRIPTION", heading_style), logo]],
+                colWidths=[120 * mm, 60 * mm],
+                style=[
+                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                    ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+                    ('LEFTPADDING', (0, 0), (0, 0), 15),
+                    ('RIGHTPADDING', (1, 0), (1, 0), 15),
+                ]
+            ),
+            HorizontalLine(PAGE_WIDTH, thickness=2, color=colors.black),
+            Spacer(1, 15),
+        ]
+        self.section_headers = {title: self.section_header(title) for title in SECTION_TITLES}
+        self.med_header = [[
+            Paragraph("Medicine Name", self.label_style),
+            Paragraph("Dosage & Route", self.label_style),
+            Paragraph("Frequency & Duration", self.label_style),
+            Paragraph("Refills", self.label_style),
+            Paragraph("Special Instructions", self.label_style)
+        ]]
+        self.patient_labels = [Paragraph(f"<b>{label}:</b>", self.label_style)
+                               for label in ("Name", "Age", "Gender", "Date")]
+        self.none_paragraph = Paragraph("None.", self.field_style)
+
+        self.general_instructions = [
+            Paragraph("<b>General Instructions</b>", plain_heading_style),
+            CenteredHorizontalLine(PAGE_WIDTH, 200, thickness=1, color=colors.black),
+            Spacer(1, 2),
+        ]
+        for i, instruction in enumerate(GENERAL_INSTRUCTIONS, start=1):
+            self.general_instructions.append(Paragraph(f"{i}. {instruction}", numbered_style))
+        self.general_instructions.append(Spacer(1, 6))
+
+    def section_header(self, text):
+        return Table(
+            [[Paragraph(f"<b>{text}</b>", self.label_style)]],
+            colWidths=[180 * mm],
+            style=[
+                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor("#d6e0f0")),
+                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+                ('LEFTPADDING', (0, 0), (-1, -1), 4),
+                ('BOX', (0, 0), (-1, -1), 0.5, colors.black),
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE')
+            ]
+        )
+
+    def draw_footer(self, canvas, doc):
+        y = 15 * mm
+        canvas.setStrokeColor(colors.grey)
+        canvas.setLineWidth(0.5)
+        canvas.line(doc.leftMargin, y + 10, doc.leftMargin + PAGE_WIDTH, y + 10)
+        self.footer.drawOn(canvas, doc.leftMargin, y - self.footer_height)
 
-    def draw_prescriber_signature(canvas, doc, prescriber_name):
-        page_width = A4[0] - doc.leftMargin - doc.rightMargin
+    def draw_prescriber_signature(self, canvas, doc, prescriber_name):
         x_start = doc.leftMargin
-        y = 70  
+        y = 70
 
         canvas.saveState()
         canvas.setStrokeColor(colors.black)
         canvas.setLineWidth(0.25)
 
         line_length = 100
-        line_x = x_start + page_width - line_length
+        line_x = x_start + PAGE_WIDTH - line_length
         canvas.line(line_x, y + 6, line_x + line_length, y + 6)
 
         canvas.setFont("Helvetica-Bold", 10)
@@ -79,125 +201,62 @@ def build_pdf(json_path):
 
         canvas.restoreState()
 
+    def new_doc(self, buffer, prescriber_name):
+        def draw_page(canvas, doc):
+            self.draw_prescriber_signature(canvas, doc, prescriber_name)
+            self.draw_footer(canvas, doc)
 
-    def draw_page(canvas, doc):
-        draw_prescriber_signature(canvas, doc, data.get("prescriber", {}).get("name", ""))
-        draw_footer(canvas, doc)
-
-
-    with open(json_path, 'r') as f:
-        data = json.load(f)
-
-
-    styles = getSampleStyleSheet()
-    label_style = ParagraphStyle("label", fontSize=10, leading=12, alignment=TA_LEFT)
-    field_style = ParagraphStyle("field", fontSize=10, leading=12, alignment=TA_LEFT, wordWrap='CJK')
-    bullet_style = ParagraphStyle("bullet", fontSize=10, leading=14, leftIndent=10, bulletIndent=0, spaceBefore=3)
-    plain_heading_style = ParagraphStyle(
-        "plain_heading_centered",
-        fontSize=12,
-        leading=14,
-        textColor=colors.HexColor("#0c1b33"),
-        spaceBefore=12,
-        spaceAfter=3,
-        alignment=TA_CENTER
-    )
-    numbered_style = ParagraphStyle("numbered", fontSize=10, leading=14, leftIndent=20, firstLineIndent=-10, spaceBefore=3, spaceAfter=3)
-
-    heading_style = ParagraphStyle(
-        name="Heading",
-        fontSize=30,
-        leading=30,
-        alignment=TA_LEFT,
-        spaceAfter=6,
-        spaceBefore=6,
-        textColor=colors.HexColor("#0c1b33"),
-        leftIndent=-16
-    )
-
-    general_instructions = [
-        "Take medications exactly as prescribed. Do not skip doses.",
-        "Avoid self-medication. Consult your doctor before taking any new drugs.",
-        "Follow up as advised by your healthcare provider.",
-        "In case of any adverse reaction or allergic symptoms, seek immediate medical help.",
-        "Carry this prescription during your hospital visits.",
-    ]
-
-
-    def section_header(text):
-        return Table(
-            [[Paragraph(f"<b>{text}</b>", label_style)]],
-            colWidths=[180 * mm],
-            style=[
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor("#d6e0f0")),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                ('LEFTPADDING', (0, 0), (-1, -1), 4),
-                ('BOX', (0, 0), (-1, -1), 0.5, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE')
-            ]
-        )
-
-
-    def generate_pdf(filename, include_general_instructions=True):
         doc = BaseDocTemplate(
-            filename,
+            buffer,
             pagesize=A4,
-            rightMargin=20,
-            leftMargin=20,
-            topMargin=20,
-            bottomMargin=60,  
+            rightMargin=MARGIN,
+            leftMargin=MARGIN,
+            topMargin=MARGIN,
+            bottomMargin=60,
         )
         frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height - 20, id='normal')
         template = PageTemplate(id='main_template', frames=frame, onPage=draw_page)
         doc.addPageTemplates([template])
+        return doc, frame
 
-        elements = []
+    def header(self, title):
+        return copy.copy(self.section_headers[title])
 
-        logo_path = "logo.png"
-        logo = Image(logo_path)
-        logo.drawHeight = 100
-        logo.drawWidth = 100
-        heading_table = Table(
-            [[Paragraph("<b>MEDICAL</b><br/>PRESCRIPTION", heading_style), logo]],
-            colWidths=[120 * mm, 60 * mm],
-            style=[
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-                ('LEFTPADDING', (0, 0), (0, 0), 15),
-                ('RIGHTPADDING', (1, 0), (1, 0), 15),
-            ]
-        )
-        elements.append(heading_table)
-        page_width = A4[0] - doc.leftMargin - doc.rightMargin
-        elements.append(HorizontalLine(page_width, thickness=2, color=colors.black))
-        elements.append(Spacer(1, 15))
+    def optional_elements(self):
+        return [copy.copy(f) for f in self.general_instructions]
+
+    def bullet_list(self, items):
+        paragraphs = [Paragraph(f"• {item['details']['text'].replace('**', '')}", self.bullet_style)
+                      for item in items] if items else [self.none_paragraph]
+        return Table([[p] for p in paragraphs], colWidths=[180 * mm],
+                     style=[("BOX", (0, 0), (-1, -1), 0.25, colors.black),
+                            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                            ("LEFTPADDING", (0, 0), (-1, -1), 6)])
+
+    def main_elements(self, data):
+        field_style = self.field_style
+        name_label, age_label, gender_label, date_label = self.patient_labels
+        elements = [copy.copy(f) for f in self.heading]
 
         pi = data.get("patient_info", {})
         patient_info = [
-            [Paragraph("<b>Name:</b>", label_style), Paragraph(str(pi.get("name", "")), field_style),
-            Paragraph("<b>Age:</b>", label_style), Paragraph(str(pi.get("age", "")), field_style),
-            Paragraph("<b>Gender:</b>", label_style), Paragraph(pi.get("gender", ""), field_style)],
-            [Paragraph("<b>Date:</b>", label_style), Paragraph(str(pi.get("date", "")), field_style),
+            [name_label, Paragraph(str(pi.get("name", "")), field_style),
+            age_label, Paragraph(str(pi.get("age", "")), field_style),
+            gender_label, Paragraph(pi.get("gender", ""), field_style)],
+            [date_label, Paragraph(str(pi.get("date", "")), field_style),
             "", "", "", ""]
         ]
-        elements.append(section_header("Patient Information"))
+        elements.append(self.header("Patient Information"))
         elements.append(Table(patient_info, colWidths=[25 * mm, 40 * mm, 15 * mm, 25 * mm, 20 * mm, 55 * mm],
                             style=[("GRID", (0, 0), (-1, -1), 0.25, colors.black)]))
         elements.append(Spacer(1, 6))
 
-        elements.append(section_header("Diagnosis"))
+        elements.append(self.header("Diagnosis"))
         elements.append(Table([[Paragraph(data.get("diagnosis", "").replace("**", "").replace("\n", "<br/>"), field_style)]], colWidths=[180 * mm],
                             style=[("BOX", (0, 0), (-1, -1), 0.25, colors.black)]))
         elements.append(Spacer(1, 6))
 
-        elements.append(section_header("Medications"))
-        med_header = [[
-            Paragraph("Medicine Name", label_style),
-            Paragraph("Dosage & Route", label_style),
-            Paragraph("Frequency & Duration", label_style),
-            Paragraph("Refills", label_style),
-            Paragraph("Special Instructions", label_style)
-        ]]
+        elements.append(self.header("Medications"))
         med_data = []
         for med in data.get("medication", []):
             med_data.append([
@@ -209,56 +268,80 @@ def build_pdf(json_path):
             ])
         if not med_data:
             med_data = [["", "", "", "", ""]]
-        elements.append(Table(med_header + med_data,
+        elements.append(Table(self.med_header + med_data,
                             colWidths=[40 * mm, 40 * mm, 45 * mm, 20 * mm, 35 * mm],
                             style=[("GRID", (0, 0), (-1, -1), 0.25, colors.black),
                                     ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#D9D9D9")),
                                     ("VALIGN", (0, 1), (-1, -1), "TOP")]))
         elements.append(Spacer(1, 6))
 
-        elements.append(section_header("Non-Pharmacological Recommendations"))
-        recs = data.get("non_pharmacological_recommendations", [])
-        recs_paragraphs = [Paragraph(f"• {rec['details']['text'].replace('**', '')}", bullet_style) for rec in recs] if recs else [Paragraph("None.", field_style)]
-        elements.append(Table([[r] for r in recs_paragraphs], colWidths=[180 * mm],
-                            style=[("BOX", (0, 0), (-1, -1), 0.25, colors.black),
-                                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                                    ("LEFTPADDING", (0, 0), (-1, -1), 6)]))
+        elements.append(self.header("Non-Pharmacological Recommendations"))
+        elements.append(self.bullet_list(data.get("non_pharmacological_recommendations", [])))
         elements.append(Spacer(1, 6))
 
-        elements.append(section_header("Medical Tests Recommended"))
-        tests = data.get("medical_tests", [])
-        tests_paragraphs = [Paragraph(f"• {test['details']['text'].replace('**', '')}", bullet_style) for test in tests] if tests else [Paragraph("None.", field_style)]
-        elements.append(Table([[t] for t in tests_paragraphs], colWidths=[180 * mm],
-                            style=[("BOX", (0, 0), (-1, -1), 0.25, colors.black),
-                                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                                    ("LEFTPADDING", (0, 0), (-1, -1), 6)]))
+        elements.append(self.header("Medical Tests Recommended"))
+        elements.append(self.bullet_list(data.get("medical_tests", [])))
         elements.append(Spacer(1, 5))
+        return elements
 
+    def generate_pdf(self, data, include_general_instructions=True):
+        buffer = io.BytesIO()
+        doc, _ = self.new_doc(buffer, data.get("prescriber", {}).get("name", ""))
+        elements = self.main_elements(data)
         if include_general_instructions:
-            elements.append(Paragraph("<b>General Instructions</b>", plain_heading_style))
-            elements.append(CenteredHorizontalLine(page_width, 200, thickness=1, color=colors.black))
-            elements.append(Spacer(1, 2))
-            for i, instruction in enumerate(general_instructions, start=1):
-                elements.append(Paragraph(f"{i}. {instruction}", numbered_style))
-            elements.append(Spacer(1, 6))
+            elements += self.optional_elements()
+        doc.build(elements)
+        return buffer.getvalue()
+
+    def render(self, data, single_pass=True):
+        if not single_pass:
+            pdf = self.generate_pdf(data, include_general_instructions=True)
+            reader = PdfReader(io.BytesIO(pdf))
+            if len(reader.pages) > 1:
+                print("More than 1 page — regenerating without General Instructions.")
+                pdf = self.generate_pdf(data, include_general_instructions=False)
+            return pdf
+
+        buffer = io.BytesIO()
+        doc, frame = self.new_doc(buffer, data.get("prescriber", {}).get("name", ""))
+        elements = self.main_elements(data)
+        optional = self.optional_elements()
+        if fits_in_frame(elements + optional, frame):
+            elements += optional
+        else:
+            print("More than 1 page — leaving out General Instructions.")
+        doc.build(elements)
+        return buffer.getvalue()
 
 
-        doc.build(elements)
+_templates = threading.local()
+
 
+def get_template():
+    # one template per thread, built on first use
+    template = getattr(_templates, "template", None)
+    if template is None:
+        template = _templates.template = PrescriptionTemplate()
+    return template
 
-    temp_filename = "temp_prescription.pdf"
-    final_filename = "prescription.pdf"
 
-    generate_pdf(temp_filename, include_general_instructions=True)
+# data: the dict from extract_prescription_data, or a path to it as JSON.
+# Returns the PDF as bytes, or writes it to `output` and returns that path.
+# The General Instructions are only included if the prescription still fits on
+# one page; single_pass=False decides that the old way, by rendering with them,
+# counting pages and rendering again without them (kept for benchmarking).
+def build_pdf(data, output=None, single_pass=True, template=None):
+    # a dict, JSON text as bytes, or the path of a JSON file
+    if isinstance(data, (bytes, bytearray)):
+        data = json.loads(data)
+    elif isinstance(data, (str, os.PathLike)):
+        with open(data, 'r') as f:
+            data = json.load(f)
 
-    reader = PdfReader(temp_filename)
-    if len(reader.pages) > 1:
-        print("More than 1 page — regenerating without General Instructions.")
-        generate_pdf(final_filename, include_general_instructions=False)
-        os.remove(temp_filename)
-    else:
-        if os.path.exists(final_filename):
-            os.remove(final_filename)
-        os.rename(temp_filename, final_filename)
+    pdf = (template or get_template()).render(data, single_pass=single_pass)
 
-    return final_filename
\ No newline at end of file
+    if output is None:
+        return pdf
+    with open(output, "wb") as f:
+        f.write(pdf)
+    return output
@@ -1,47 +1,331 @@
-import whisper
+import queue
+import threading
+import time
+import wave
+from collections import deque
+from contextlib import contextmanager
+
 import sounddevice as sd
 import numpy as np
-from scipy.signal import resample
-from silero_vad import load_silero_vad, get_speech_timestamps
-from tts import text_to_speech
+import torch
+from silero_vad import load_silero_vad, VADIterator
+
+import config
+from model_registry import registry
+from tts import text_to_speech, stop_speech, SPEAK_NOW_PROMPT
+
+# Silero VAD scores 512-sample windows at 16 kHz
+VAD_WINDOW = 512
+
+
+# Fixed-capacity int16 buffer that keeps the most recent samples.
+class RingBuffer:
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.size = 0
+        self.end = 0
+
+    def extend(self, samples):
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        first = min(n, self.capacity - self.end)
+        self.data[self.end:self.end + first] = samples[:first]
+        self.data[:n - first] = samples[first:]
+        self.end = (self.end + n) % self.capacity
+        self.size = min(self.capacity, self.size + n)
+
+    def read(self):
+        start = (self.end - self.size) % self.capacity
+        if start + self.size <= self.capacity:
+            return self.data[start:start + self.size].copy()
+        return np.concatenate([self.data[start:], self.data[:self.end]])
+
+
+# Microphone input stream; the callback only queues blocks, all work happens in read().
+class MicrophoneSource:
+    def __init__(self, sample_rate=16000, blocksize=VAD_WINDOW):
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue()
+        self._stream = sd.InputStream(samplerate=sample_rate, blocksize=blocksize, channels=1,
+                                      dtype='int16', callback=self._callback)
+
+    def _callback(self, indata, frames, time_info, status):
+        self._queue.put(indata[:, 0].copy())
+
+    def __enter__(self):
+        self._stream.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stream.stop()
+        self._stream.close()
+
+    def read(self, timeout=1.0):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return np.empty(0, dtype=np.int16)
+
+
+# Stand-in for MicrophoneSource that plays a WAV file, optionally at real-time pace.
+# read() returns None once the file is exhausted.
+class WavFileSource:
+    def __init__(self, path, sample_rate=16000, blocksize=VAD_WINDOW, realtime=False):
+        with wave.open(path, 'rb') as w:
+            if w.getsampwidth() != 2:
+                raise ValueError(f"{path}: expected 16-bit PCM")
+            audio = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+            audio = audio.reshape(-1, w.getnchannels())[:, 0]
+            rate = w.getframerate()
+        if rate != sample_rate:
+            positions = np.arange(0, len(audio), rate / sample_rate)
+            audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.int16)
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.realtime = realtime
+        self.position = 0
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def time_at(self, sample):
+        # wall-clock time at which `sample` was (or would be) captured
+        return self.started + sample / self.sample_rate
+
+    def read(self, timeout=1.0):
+        if self.position >= len(self.audio):
+            return None
+        block = self.audio[self.position:self.position + self.blocksize]
+        self.position += len(block)
+        if self.realtime:
+            delay = self.time_at(self.position) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return block
+
+
+def capture_utterance(source, vad_model, sample_rate=16000, max_duration=None, trailing_silence_ms=None,
+                      no_speech_timeout=None, threshold=None, preroll_ms=300):
+    # Reads `source` until trailing_silence_ms of non-speech follows speech,
+    # no speech starts within no_speech_timeout, or max_duration is reached.
+    max_samples = int((max_duration or config.STT_MAX_DURATION) * sample_rate)
+    trailing = int((trailing_silence_ms or config.STT_TRAILING_SILENCE_MS) * sample_rate / 1000)
+    no_speech = int((no_speech_timeout or config.STT_NO_SPEECH_TIMEOUT) * sample_rate)
+    threshold = threshold or config.STT_VAD_THRESHOLD
+
+    deadline = time.monotonic() + max_samples / sample_rate + 5
+    vad_model.reset_states()
+    preroll = RingBuffer(max(VAD_WINDOW, int(preroll_ms * sample_rate / 1000)))
+    frames = []
+    pending = np.empty(0, dtype=np.int16)
+    speech_started = False
+    silence = 0
+    captured = 0
+
+    while captured < max_samples and time.monotonic() < deadline:
+        block = source.read()
+        if block is None:
+            break
+        pending = np.concatenate([pending, block]) if len(pending) else block
+        while len(pending) >= VAD_WINDOW and captured < max_samples:
+            window, pending = pending[:VAD_WINDOW], pending[VAD_WINDOW:]
+            captured += VAD_WINDOW
+            prob = vad_model(torch.from_numpy(window.astype(np.float32) / 32768.0), sample_rate).item()
+
+            if speech_started:
+                frames.append(window)
+            else:
+                preroll.extend(window)
 
+            if prob >= threshold:
+                if not speech_started:
+                    speech_started = True
+                    frames.append(preroll.read())
+                silence = 0
+            elif speech_started:
+                silence += VAD_WINDOW
+                if silence >= trailing:
+                    return np.concatenate(frames)
+            elif captured >= no_speech:
+                return np.empty(0, dtype=np.int16)
 
-def record_until_silence(sample_rate=16000, timeout=10):
-    text_to_speech("You can speak now...")
-    audio = sd.rec(int(timeout * sample_rate), samplerate=sample_rate, channels=1, dtype='int16')
-    sd.wait()
+    if not speech_started:
+        return np.empty(0, dtype=np.int16)
+    return np.concatenate(frames)
+
+
+def record_until_silence(sample_rate=16000, timeout=10, source=None):
+    # don't record the tail of a question that is still playing
+    stop_speech()
+    text_to_speech(SPEAK_NOW_PROMPT)
+    if source is None and not config.STT_STREAMING:
+        audio = sd.rec(int(timeout * sample_rate), samplerate=sample_rate, channels=1, dtype='int16')
+        sd.wait()
+        print("Recording complete.")
+        return audio.flatten()
+
+    source = source or MicrophoneSource(sample_rate)
+    with source, get_vad_engine().model() as vad_model:
+        audio = capture_utterance(source, vad_model, sample_rate)
     print("Recording complete.")
-    return audio.flatten()
+    return audio
 
 
-def extract_all_voice_with_padding(audio_int16, sample_rate=16000, padding_ms=200):
-    vad_model = load_silero_vad()
-    wav = audio_int16.astype(np.float32) / 32768.0
+# Silero VAD models loaded once per process and reused across calls and
+# sessions. A model carries per-stream state, so each caller borrows its own;
+# the pool only grows when streams overlap.
+class VadEngine:
+    def __init__(self):
+        self._free = [load_silero_vad()]
+        self._lock = threading.Lock()
+        self.models_loaded = 1
+
+    @contextmanager
+    def model(self):
+        with self._lock:
+            vad_model = self._free.pop() if self._free else None
+        if vad_model is None:
+            vad_model = load_silero_vad()
+            with self._lock:
+                self.models_loaded += 1
+        vad_model.reset_states()
+        try:
+            yield vad_model
+        finally:
+            with self._lock:
+                self._free.append(vad_model)
+
+    def stream(self, sample_rate=16000, padding_ms=200, **kwargs):
+        return VadStream(self, sample_rate, padding_ms, **kwargs)
+
+    def extract_voice(self, audio_int16, sample_rate=16000, padding_ms=200):
+        with self.stream(sample_rate, padding_ms) as vad:
+            segments = vad.feed(audio_int16) + vad.flush()
+        if not segments:
+            return np.array([], dtype=np.float32)
+        return segments[0] if len(segments) == 1 else np.concatenate(segments)
+
+
+registry.register("silero_vad", VadEngine)
+
+
+def get_vad_engine():
+    return registry.get("silero_vad")
+
 
-    speech_ts = get_speech_timestamps(wav, vad_model, sampling_rate=sample_rate)
-    if not speech_ts:
-        return np.array([], dtype=np.float32)
+# Incremental VAD: feed() int16 chunks of any size and get back the padded
+# float32 speech segments that have completed so far. Segments whose padding
+# overlaps are merged, so no sample is returned twice: a finished segment is
+# held until no later speech start, padded, could reach back into it.
+# `spans` lists the (start, end) sample range of every returned segment.
+class VadStream:
+    def __init__(self, engine, sample_rate=16000, padding_ms=200, threshold=0.5,
+                 min_silence_ms=100, min_speech_ms=250):
+        self._model_ctx = engine.model()
+        self._iterator = VADIterator(self._model_ctx.__enter__(), threshold=threshold, sampling_rate=sample_rate,
+                                     min_silence_duration_ms=min_silence_ms, speech_pad_ms=0)
+        self.padding = int(sample_rate * padding_ms / 1000)
+        self.min_speech = int(sample_rate * min_speech_ms / 1000)
+        self._remainder = np.empty(0, dtype=np.int16)
+        self._windows = deque()
+        self._first = 0       # absolute index of the first buffered sample
+        self._seen = 0        # samples scored so far
+        self._start = None    # padded start of the open segment
+        self._end = None      # padded end once its speech has ended
+        self._speech = 0      # unpadded speech samples in the open segment
+        self._speech_start = None
+        self.spans = []
 
-    padding = int(sample_rate * (padding_ms / 1000))
-    voiced_segments = []
+    def __enter__(self):
+        return self
 
-    for segment in speech_ts:
-        start = max(0, segment['start'] - padding)
-        end = min(len(wav), segment['end'] + padding)
-        voiced_segments.append(wav[start:end])
+    def __exit__(self, *exc):
+        self.close()
 
-    return np.concatenate(voiced_segments)
+    def close(self):
+        if self._model_ctx is not None:
+            self._model_ctx.__exit__(None, None, None)
+            self._model_ctx = None
 
+    def feed(self, chunk_int16):
+        if len(self._remainder):
+            chunk_int16 = np.concatenate([self._remainder, chunk_int16])
+        usable = len(chunk_int16) - len(chunk_int16) % VAD_WINDOW
+        self._remainder = chunk_int16[usable:].copy()
 
-def speech_to_text(model):
-    raw_audio = record_until_silence()
+        segments = []
+        for offset in range(0, usable, VAD_WINDOW):
+            window = chunk_int16[offset:offset + VAD_WINDOW].astype(np.float32) / 32768.0
+            self._windows.append(window)
+            self._seen += VAD_WINDOW
+            event = self._iterator(window)
 
+            if event and 'start' in event:
+                start = max(0, event['start'] - self.padding)
+                if self._end is not None and start > self._end:
+                    self._emit(segments)
+                if self._start is None:
+                    self._start = start
+                self._end = None
+                self._speech_start = event['start']
+            elif event and 'end' in event:
+                self._speech += event['end'] - self._speech_start
+                self._end = event['end'] + self.padding
+
+            # a start seen from here on is padded to at least _seen - padding
+            if self._end is not None and self._seen >= self._end + self.padding:
+                self._emit(segments)
+            self._trim()
+        return segments
+
+    def flush(self):
+        segments = []
+        if self._start is not None:
+            if self._end is None:
+                self._speech += self._seen - self._speech_start
+            self._end = min(self._end or self._seen, self._seen)
+            self._emit(segments)
+        self._iterator.reset_states()
+        self.close()
+        return segments
+
+    def _emit(self, segments):
+        if self._speech >= self.min_speech:
+            audio = np.concatenate(self._windows)
+            segments.append(audio[self._start - self._first:self._end - self._first])
+            self.spans.append((self._start, self._end))
+        self._start = self._end = None
+        self._speech = 0
+
+    def _trim(self):
+        # keep only what a future segment could still need
+        keep_from = self._start if self._start is not None else self._seen - self.padding
+        while self._windows and self._first + VAD_WINDOW <= keep_from:
+            self._windows.popleft()
+            self._first += VAD_WINDOW
+
+
+def extract_all_voice_with_padding(audio_int16, sample_rate=16000, padding_ms=200):
+    return get_vad_engine().extract_voice(audio_int16, sample_rate, padding_ms)
+
+
+def speech_to_text(model, source=None):
+    raw_audio = record_until_silence(source=source)
+    return transcribe_audio(model, raw_audio)
+
+
+def transcribe_audio(model, raw_audio):
     voice_audio = extract_all_voice_with_padding(raw_audio)
 
     if voice_audio.size == 0:
         return "[No speech detected]"
 
-    audio_16k = resample(voice_audio, int(len(voice_audio) * 16000 / 16000)).astype(np.float32)
-
-    result = model.transcribe(audio_16k, fp16=False, language='en')
-    return result["text"]
\ No newline at end of file
+    # capture is already 16 kHz float32, which is what every backend expects
+    return model.transcribe(voice_audio, language='en')
\ No newline at end of file
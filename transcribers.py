@@ -0,0 +1,59 @@
+import numpy as np
+
+import config
+from model_registry import registry
+
+
+# openai-whisper checkpoints; `model` is a size name ("base", "small", ...) or
+# a local .pt path.
+class WhisperTranscriber:
+    name = "whisper"
+
+    def __init__(self, model, device="cpu"):
+        import whisper
+
+        self.model = whisper.load_model(model, device=device)
+        self.fp16 = device != "cpu"
+
+    def transcribe(self, audio, language="en"):
+        result = self.model.transcribe(audio, fp16=self.fp16, language=language)
+        return result["text"]
+
+
+# CTranslate2 inference via faster-whisper; int8 weights on CPU by default.
+# `model` is a size name or a local directory with a converted model.
+class FasterWhisperTranscriber:
+    name = "faster-whisper"
+
+    def __init__(self, model, device="cpu", compute_type="int8", cpu_threads=0, beam_size=1):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(model, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+        self.beam_size = beam_size
+
+    def transcribe(self, audio, language="en"):
+        segments, _ = self.model.transcribe(audio, language=language, beam_size=self.beam_size)
+        return "".join(segment.text for segment in segments)
+
+
+backends = {
+    WhisperTranscriber.name: WhisperTranscriber,
+    FasterWhisperTranscriber.name: FasterWhisperTranscriber,
+}
+
+
+def load_transcriber(backend=None, model=None, **kwargs):
+    backend = backend or config.STT_BACKEND
+    model = model or config.STT_MODEL
+    if backend not in backends:
+        raise ValueError(f"Unknown speech-to-text backend: {backend}")
+    if backend == FasterWhisperTranscriber.name:
+        kwargs.setdefault("compute_type", config.STT_COMPUTE_TYPE)
+    return backends[backend](model, **kwargs)
+
+
+registry.register("transcriber", load_transcriber)
+
+
+def transcribe(audio, language="en"):
+    return registry.get("transcriber").transcribe(np.asarray(audio, dtype=np.float32), language)
@@ -1,21 +1,156 @@
-from gtts import gTTS
 import pygame
-import tempfile
-import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def text_to_speech(text, lang='en'):
-    tts = gTTS(text=text, lang=lang, slow=False)
+import config
+from disk_cache import DiskCache
+from tts_engines import engine_class, load_engine
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as fp:
-        temp_path = fp.name
-        tts.save(temp_path)
+SPEAK_NOW_PROMPT = "You can speak now..."
+DESCRIBE_SYMPTOMS_PROMPT = "Please describe your symptoms. Please speak when told to do so."
 
-    pygame.mixer.init()
-    pygame.mixer.music.load(temp_path)
-    pygame.mixer.music.play()
+# Spoken on every consultation; synthesized once at startup
+FIXED_PROMPTS = [SPEAK_NOW_PROMPT, DESCRIBE_SYMPTOMS_PROMPT]
 
-    while pygame.mixer.music.get_busy():
-        pygame.time.Clock().tick(10)
+_engine = None
+_cache = None
+_engine_lock = threading.Lock()
 
-    pygame.mixer.quit()
-    os.remove(temp_path)
\ No newline at end of file
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = load_engine(config.TTS_ENGINE)
+        return _engine
+
+
+def get_speech_cache():
+    # only needs the engine's file suffix, so an engine that can't start (no
+    # binary or voice) doesn't break pages that never speak
+    global _cache
+    with _engine_lock:
+        if _cache is None:
+            _cache = DiskCache(
+                config.TTS_CACHE_DIR,
+                max_bytes=config.TTS_CACHE_MAX_MB * 2 ** 20,
+                suffix=engine_class(config.TTS_ENGINE).suffix,
+            )
+        return _cache
+
+
+# Path of an audio file for `text`, synthesized only on a cache miss.
+def synthesize(text, lang='en'):
+    engine = get_engine()
+    cache = get_speech_cache()
+    key = DiskCache.key(engine.cache_key, lang, text)
+    path = cache.get_path(key)
+    if path is not None:
+        return path
+    return cache.put(key, engine.synthesize(text, lang))
+
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tts-prefetch")
+_prefetching = set()
+_prefetch_lock = threading.Lock()
+
+
+def _prefetch_one(text, lang):
+    try:
+        synthesize(text, lang)
+    except Exception as e:
+        print(f"Could not pre-synthesize {text!r}: {e}")
+    finally:
+        with _prefetch_lock:
+            _prefetching.discard((text, lang))
+
+
+# Synthesizes `texts` into the cache in the background, skipping any already
+# queued, so it is cheap to call again on every rerun.
+def prefetch(texts, lang='en'):
+    futures = []
+    for text in texts:
+        with _prefetch_lock:
+            if (text, lang) in _prefetching:
+                continue
+            _prefetching.add((text, lang))
+        futures.append(_prefetch_pool.submit(_prefetch_one, text, lang))
+    return futures
+
+
+# Long-lived playback thread: keeps the mixer open and plays queued
+# utterances in order without blocking the caller.
+class AudioPlayer:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._skip = threading.Event()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="tts-player", daemon=True)
+        self._worker.start()
+
+    def say(self, text, lang='en'):
+        # returns an Event that is set once the utterance has finished or been dropped
+        done = threading.Event()
+        with self._lock:
+            self._queue.put((self._generation, text, lang, done))
+        return done
+
+    def skip(self):
+        self._skip.set()
+
+    def cancel(self):
+        # drop everything queued and stop what is playing
+        with self._lock:
+            self._generation += 1
+        self._skip.set()
+
+    def _run(self):
+        pygame.mixer.init()
+        while True:
+            generation, text, lang, done = self._queue.get()
+            try:
+                if generation != self._generation:
+                    continue
+                path = synthesize(text, lang)
+                # clear before the last check, so a cancel() landing in between
+                # still stops this utterance
+                self._skip.clear()
+                if generation != self._generation:
+                    continue
+                pygame.mixer.music.load(path)
+                pygame.mixer.music.play()
+                while pygame.mixer.music.get_busy():
+                    if self._skip.is_set() or generation != self._generation:
+                        pygame.mixer.music.stop()
+                        break
+                    time.sleep(0.02)
+            except Exception as e:
+                print(f"Could not play {text!r}: {e}")
+            finally:
+                done.set()
+
+
+_player = None
+_player_lock = threading.Lock()
+
+
+def get_player():
+    global _player
+    with _player_lock:
+        if _player is None:
+            _player = AudioPlayer()
+        return _player
+
+
+def stop_speech():
+    get_player().cancel()
+
+
+def text_to_speech(text, lang='en', wait=True):
+    done = get_player().say(text, lang)
+    if wait:
+        done.wait()
+    return done
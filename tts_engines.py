@@ -0,0 +1,112 @@
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+
+import config
+
+
+# Google's online TTS; needs network access.
+class GTTSEngine:
+    name = "gtts"
+    suffix = ".mp3"
+
+    def __init__(self):
+        self.cache_key = self.name
+
+    def synthesize(self, text, lang='en'):
+        from gtts import gTTS
+
+        buf = io.BytesIO()
+        gTTS(text=text, lang=lang, slow=False).write_to_fp(buf)
+        return buf.getvalue()
+
+
+# Offline formant synthesizer (espeak-ng, or classic espeak). Fast on any CPU.
+class EspeakEngine:
+    name = "espeak"
+    suffix = ".wav"
+
+    def __init__(self, voice=None, speed=None):
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+        if self.binary is None:
+            raise RuntimeError("espeak-ng is not installed")
+        self.voice = voice or config.ESPEAK_VOICE
+        self.speed = speed or config.ESPEAK_SPEED
+        self.cache_key = f"{self.name}:{self.voice}:{self.speed}"
+
+    def synthesize(self, text, lang='en'):
+        voice = self.voice if lang == 'en' else lang
+        result = subprocess.run([self.binary, "--stdout", "-v", voice, "-s", str(self.speed), text],
+                                check=True, capture_output=True)
+        return result.stdout
+
+
+# Offline neural voice using a Piper .onnx model, run on CPU through the piper CLI.
+class PiperEngine:
+    name = "piper"
+    suffix = ".wav"
+
+    def __init__(self, model=None, binary=None):
+        self.model = model or config.PIPER_MODEL
+        self.binary = binary or config.PIPER_BINARY
+        if not self.model or not os.path.exists(self.model):
+            raise RuntimeError("PIPER_MODEL must point to a Piper .onnx voice")
+        if shutil.which(self.binary) is None:
+            raise RuntimeError(f"{self.binary} is not installed")
+        self.cache_key = f"{self.name}:{os.path.basename(self.model)}"
+
+    def synthesize(self, text, lang='en'):
+        # a Piper voice is tied to one language, so `lang` is ignored
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            subprocess.run([self.binary, "--model", self.model, "--output_file", path],
+                           input=text.encode("utf-8"), check=True, capture_output=True)
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+# Silence as long as the text would take to say. Stands in for a real voice in
+# offline benchmarks and on machines without audio.
+class SilentEngine:
+    name = "silent"
+    suffix = ".wav"
+
+    def __init__(self, words_per_minute=160, sample_rate=16000):
+        self.words_per_minute = words_per_minute
+        self.sample_rate = sample_rate
+        self.cache_key = self.name
+
+    def synthesize(self, text, lang='en'):
+        seconds = max(0.5, len(text.split()) * 60 / self.words_per_minute)
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(self.sample_rate)
+            w.writeframes(b"\0\0" * int(seconds * self.sample_rate))
+        return buf.getvalue()
+
+
+engines = {
+    GTTSEngine.name: GTTSEngine,
+    EspeakEngine.name: EspeakEngine,
+    PiperEngine.name: PiperEngine,
+    SilentEngine.name: SilentEngine,
+}
+
+
+def engine_class(name=None):
+    name = name or config.TTS_ENGINE
+    if name not in engines:
+        raise ValueError(f"Unknown TTS engine: {name}")
+    return engines[name]
+
+
+def load_engine(name=None):
+    return engine_class(name)()